@@ -0,0 +1,214 @@
+"""htmlrunner自身开销的基准测试
+
+生成由大量空用例组成的测试目录, 分别统计发现用例, 执行(相对unittest的额外开销), register, sortByClass,
+生成报告的耗时, 以及报告大小和进程内存峰值; 每个场景在独立的子进程中执行
+
+用法:
+    python benchmarks/bench_runner.py --sizes 1000,10000 --output bench.json
+    python benchmarks/bench_runner.py --compare bench.json  # 与之前的结果比较, 开销增加超过阈值时返回1
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASEDIR not in sys.path:
+    sys.path.insert(0, BASEDIR)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = {
+    'plain': dict(),
+    'output': dict(output=True),  # 每个用例都有输出
+    'failures': dict(fail_every=10),  # 10%的用例失败
+    'images': dict(image_every=10),  # 10%的用例带图片
+    'fixtures': dict(fixtures=True),  # 每个模块和测试类都有setUp/tearDown
+}
+
+DEFAULT_SIZES = '1000,10000'
+
+TESTS_PER_CLASS = 50
+
+CLASSES_PER_MODULE = 10
+
+COMPARE_METRICS = ('discover_s', 'overhead_us', 'register_us', 'sort_by_class_s', 'report_s')  # 越小越好
+
+DEFAULT_THRESHOLD = 0.2  # 比较时允许的增幅
+
+
+def generate_tests(path, size, output=False, fail_every=0, image_every=0, fixtures=False):
+    """在path下生成size个用例, 每个测试类TESTS_PER_CLASS个用例, 每个模块CLASSES_PER_MODULE个测试类"""
+    n = 0
+    module_index = 0
+    while n < size:
+        lines = ['import unittest', '']
+        if fixtures:
+            lines += ['def setUpModule():', '    pass', '', 'def tearDownModule():', '    pass', '']
+        for class_index in range(CLASSES_PER_MODULE):
+            if n >= size:
+                break
+            lines.append('class TestBench%s(unittest.TestCase):' % class_index)
+            if fixtures:
+                lines += ['    @classmethod', '    def setUpClass(cls):', '        pass',
+                          '    def setUp(self):', '        pass']
+            for _ in range(min(TESTS_PER_CLASS, size - n)):
+                n += 1
+                lines.append('    def test_%s(self):' % n)
+                if output:
+                    lines.append('        print("output of test %s")' % n)
+                if image_every and n % image_every == 0:
+                    lines.append('        self.images = [("bin", b"image %s")]' % n)
+                if fail_every and n % fail_every == 0:
+                    lines.append('        self.fail("failure %s")' % n)
+                lines.append('        pass')
+            lines.append('')
+        with open(os.path.join(path, 'test_bench_%s.py' % module_index), 'w') as f:
+            f.write('\n'.join(lines))
+        module_index += 1
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # macOS为字节, Linux为KB
+
+
+def measure(scenario, size):
+    """在子进程中执行一个场景, 返回统计数据"""
+    from htmlrunner.loader import Loader
+    from htmlrunner.result import Result
+    from htmlrunner.runner import Runner, HTMLRunner
+    from logz import log
+
+    log.level = 'warning'  # 执行日志不计入结果
+    stdout, stderr = sys.stdout, sys.stderr
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, 'w') as devnull:
+        tests_dir = os.path.join(tmp_dir, 'tests')
+        os.makedirs(tests_dir)
+        generate_tests(tests_dir, size, **SCENARIOS[scenario])
+        sys.stdout = sys.stderr = devnull  # 用例输出不计入结果
+        try:
+            t0 = time.perf_counter()
+            loader = Loader(tests_dir)
+            suite = loader.suite
+            discover = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            loader.suite.run(unittest.TestResult())  # unittest自身的执行耗时作为基准
+            bare = time.perf_counter() - t0
+
+            register = Result.register
+            register_time = [0.0]
+
+            def timed_register(self, *args, **kwargs):
+                t = time.perf_counter()
+                try:
+                    return register(self, *args, **kwargs)
+                finally:
+                    register_time[0] += time.perf_counter() - t
+
+            Result.register = timed_register
+            try:
+                t0 = time.perf_counter()
+                result = Runner(output=tmp_dir).run(suite)
+                run = time.perf_counter() - t0
+            finally:
+                Result.register = register
+
+            t0 = time.perf_counter()
+            result.sortByClass()
+            sort_by_class = time.perf_counter() - t0
+
+            runner = HTMLRunner(report_file='report.html', log_file=os.path.join(tmp_dir, 'run.log'), output=tmp_dir)
+            t0 = time.perf_counter()
+            runner.generate_report(result)
+            report = time.perf_counter() - t0
+            report_size = os.path.getsize(runner.report_file)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+    return dict(
+        scenario=scenario,
+        size=size,
+        tests_run=result.testsRun,
+        discover_s=round(discover, 4),
+        bare_run_s=round(bare, 4),
+        run_s=round(run, 4),
+        overhead_us=round((run - bare) / size * 1e6, 2),  # 每个用例的额外开销
+        register_us=round(register_time[0] / size * 1e6, 2),
+        sort_by_class_s=round(sort_by_class, 4),
+        report_s=round(report, 4),
+        report_kb=round(report_size / 1024, 1),
+        peak_memory_mb=peak_memory_mb(),
+    )
+
+
+def run_in_subprocess(scenario, size):
+    with ProcessPoolExecutor(max_workers=1) as executor:  # 独立进程, 内存峰值及模块缓存互不影响
+        return executor.submit(measure, scenario, size).result()
+
+
+def compare(results, baseline_file, threshold=DEFAULT_THRESHOLD) -> list:
+    """返回开销增幅超过阈值的指标"""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = {(item['scenario'], item['size']): item for item in json.load(f)['results']}
+    regressions = []
+    for item in results:
+        old = baseline.get((item['scenario'], item['size']))
+        if not old:
+            continue
+        for metric in COMPARE_METRICS:
+            if old[metric] and item[metric] > old[metric] * (1 + threshold):
+                regressions.append('%s/%s %s: %s -> %s' % (item['scenario'], item['size'], metric,
+                                                          old[metric], item[metric]))
+    return regressions
+
+
+TABLE_COLUMNS = ('scenario', 'size', 'discover_s', 'run_s', 'overhead_us', 'register_us', 'sort_by_class_s',
+                 'report_s', 'report_kb', 'peak_memory_mb')
+
+
+def print_row(values):
+    print(' '.join('%15s' % value for value in values))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='htmlrunner自身开销的基准测试')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='用例数, 逗号分隔, 如1000,10000,100000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='场景, 逗号分隔: %s' % ','.join(SCENARIOS))
+    parser.add_argument('--output', help='结果保存为json文件')
+    parser.add_argument('--compare', help='与之前保存的json结果比较')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='比较时允许的增幅')
+    args = parser.parse_args(argv)
+
+    results = []
+    print_row(TABLE_COLUMNS)
+    for size in map(int, args.sizes.split(',')):
+        for scenario in args.scenarios.split(','):
+            results.append(run_in_subprocess(scenario, size))
+            print_row(results[-1][column] for column in TABLE_COLUMNS)
+
+    data = dict(python=platform.python_version(), platform=platform.platform(), results=results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
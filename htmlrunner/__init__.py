@@ -1 +1,8 @@
-from htmlrunner.runner import Runner, Result, HTMLRunner
\ No newline at end of file
+__all__ = ['Runner', 'Result', 'HTMLRunner']
+
+
+def __getattr__(name):  # 使用时才导入runner, 只收集用例(如命令行--collect-only)时无需导入jinja2/logz等
+    if name in __all__:
+        from htmlrunner import runner
+        return getattr(runner, name)
+    raise AttributeError("module 'htmlrunner' has no attribute '%s'" % name)
@@ -0,0 +1,5 @@
+import sys
+
+from htmlrunner.cli import main
+
+sys.exit(main())
@@ -0,0 +1,119 @@
+"""命令行入口: python -m htmlrunner 或 htmlrunner
+
+    htmlrunner tests --tags smoke --level 2 --workers 4 -o report.html
+    htmlrunner tests --collect-only --cache-file .htmlrunner_index.json
+    htmlrunner tests --collect-only --static --format jsonl
+    htmlrunner tests --coverage-map .htmlrunner_coverage.json --changed-since origin/master
+
+只在需要时才导入runner(jinja2, logz等), --help和--collect-only无需导入
+"""
+import argparse
+import subprocess
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='htmlrunner', description='执行unittest用例并生成HTML报告')
+    parser.add_argument('path', nargs='?', default='.', help='用例目录, 默认当前目录')
+    parser.add_argument('-p', '--pattern', default='test*.py', help='用例文件匹配模式')
+    parser.add_argument('--cache-file', help='用例索引文件, 未修改的测试文件无需重新导入')
+    parser.add_argument('--collect-only', action='store_true', help='只列出用例, 不执行')
+    parser.add_argument('--format', default='text', choices=('text', 'ids', 'jsonl'), help='--collect-only的输出格式')
+    parser.add_argument('--static', action='store_true', help='解析语法树收集用例, 不导入测试文件')
+
+    group = parser.add_argument_group('筛选用例')
+    group.add_argument('--tags', help='标签, 逗号分隔')
+    group.add_argument('--level', type=int, help='只执行小于等于该level的用例')
+    group.add_argument('--list', dest='testlist', help='用例列表文件, 每行一个用例id或用例方法名')
+    group.add_argument('--last-run', help='上次运行的事件日志, 上次失败/修改过的测试类优先执行')
+    group.add_argument('--changed', help='修改的文件, 逗号分隔, 只执行受影响的用例(需要--coverage-map)')
+    group.add_argument('--changed-since', help='git版本, 只执行受此后修改的文件影响的用例(需要--coverage-map)')
+
+    group = parser.add_argument_group('运行选项')
+    group.add_argument('--threads', type=int, help='线程数')
+    group.add_argument('--workers', type=int, help='进程数')
+    group.add_argument('--isolate', action='store_true', help='每个用例在独立子进程中执行')
+    group.add_argument('--timeout', type=float, help='每个用例的超时时间(秒)')
+    group.add_argument('--failfast', action='store_true', help='遇到失败时停止')
+    group.add_argument('--reruns', type=int, default=0, help='失败用例重跑次数')
+    group.add_argument('--timing-db', help='历史耗时文件, 并行执行时按耗时分配分片')
+    group.add_argument('--coverage-map', help='用例覆盖记录文件, 执行时记录每个用例执行的源码行')
+
+    group = parser.add_argument_group('报告')
+    group.add_argument('-o', '--report-file', help='报告文件, 支持日期格式如report_%%Y%%m%%d.html')
+    group.add_argument('--output', help='报告目录')
+    group.add_argument('--log-file', help='日志文件')
+    group.add_argument('--title', help='报告标题')
+    group.add_argument('--description', help='报告描述')
+    group.add_argument('--tester', help='测试人员')
+    group.add_argument('--template', help='模板名或模板文件路径')
+    group.add_argument('--template-dir', action='append', dest='template_dirs', help='自定义模板目录, 可多次指定')
+    group.add_argument('--lazy', action='store_true', help='分页报告')
+    group.add_argument('--event-log', help='事件日志文件')
+    group.add_argument('--export', action='append', dest='exporters',
+                       help='导出文件(.xml/.jsonl/.htrb), 可多次指定')
+    return parser
+
+
+def _intersect(selected, ids):
+    if selected is None:
+        return ids
+    ids = set(ids)
+    return [test_id for test_id in selected if test_id in ids]
+
+
+def select_tests(loader, args):
+    """按筛选条件返回用例id, 多个条件取交集, 没有筛选条件时返回None"""
+    selected = None
+    if args.tags:
+        selected = loader.index.select_by_tags(args.tags.split(','))
+    if args.level is not None:
+        selected = _intersect(selected, loader.index.select_by_level(args.level))
+    if args.testlist:
+        selected = _intersect(selected, loader.select_by_list(args.testlist))
+    changed = get_changed_files(args)
+    if changed is not None:
+        selected = _intersect(selected, loader.select_by_changes(changed, args.coverage_map))
+    return selected
+
+
+def get_changed_files(args):
+    """--changed或--changed-since指定的修改文件, 未指定时返回None"""
+    if not args.changed and not args.changed_since:
+        return None
+    if not args.coverage_map:
+        raise SystemExit('--changed/--changed-since需要同时指定--coverage-map')
+    changed = args.changed.split(',') if args.changed else []
+    if args.changed_since:
+        output = subprocess.check_output(['git', 'diff', '--name-only', args.changed_since],
+                                         universal_newlines=True)
+        top_level = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], universal_newlines=True)
+        changed.extend('%s/%s' % (top_level.strip(), line) for line in output.splitlines() if line)
+    return changed
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    from htmlrunner.loader import Loader
+
+    loader = Loader(args.path, args.pattern, cache_file=args.cache_file, static=args.static)
+    test_ids = select_tests(loader, args)
+    if args.collect_only:
+        loader.collect_only(test_ids=test_ids, fmt=args.format)
+        return 0
+
+    suite = None if test_ids is None else loader.load(test_ids)  # 筛选后的用例同样按上次运行结果及order排列
+    if args.last_run:
+        suite = loader.psuite(args.last_run, suite)
+    else:
+        suite = loader.osuite if suite is None else loader.order_suite(suite)
+
+    from htmlrunner.runner import HTMLRunner
+    runner = HTMLRunner(report_file=args.report_file, log_file=args.log_file, output=args.output,
+                        title=args.title, description=args.description, tester=args.tester,
+                        template=args.template, template_dirs=args.template_dirs, lazy=args.lazy,
+                        failfast=args.failfast, threads=args.threads, timeout=args.timeout,
+                        workers=args.workers, isolate=args.isolate, event_log=args.event_log,
+                        timing_db=args.timing_db, reruns=args.reruns, exporters=args.exporters,
+                        coverage_map=args.coverage_map)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
@@ -0,0 +1,190 @@
+import os
+import re
+import sys
+import csv
+import json
+import threading
+from functools import wraps
+
+NAME_PARTTEN = re.compile(r'\W')
+
+MAX_NAME_VALUE_LENGTH = 30  # 用例名中数据值的最大长度
+
+_sources = {}  # (文件路径, mtime, 大小, 选项): 数据源, 多个测试类使用同一数据文件时只解析一次
+
+_sources_lock = threading.Lock()
+
+_module_data_files = {}  # 模块名: 其中数据驱动用例使用的数据文件, 用例索引据此判断缓存是否过期
+
+
+def _call_args(row):
+    """数据行转为调用参数: dict作为关键字参数, list/tuple作为位置参数, 其他作为一个参数"""
+    if isinstance(row, dict):
+        return (), row
+    if isinstance(row, (list, tuple)):
+        return tuple(row), {}
+    return (row,), {}
+
+
+class ValuesSource(object):
+    """data装饰器中的数据, 每个值作为一个参数传入"""
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def args(self, index):
+        return (self.values[index],), {}
+
+    def name(self, index) -> str:
+        value = self.values[index]
+        if isinstance(value, (str, int, float, bool)) and len(str(value)) <= MAX_NAME_VALUE_LENGTH:
+            return '%s_%s' % (index + 1, NAME_PARTTEN.sub('_', str(value)))
+        return str(index + 1)
+
+
+class TimesSource(object):
+    """times装饰器, 重复执行n次, 不传入参数"""
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def args(self, index):
+        return (), {}
+
+    def name(self, index) -> str:
+        return str(index + 1)
+
+
+class LineFileSource(object):
+    """csv/jsonl数据文件, 只记录每行的偏移位置, 执行用例时才读取并解析对应的行"""
+    def __init__(self, path, encoding='utf-8', header=True, delimiter=','):
+        self.path = path
+        self.encoding = encoding
+        self.is_csv = not path.lower().endswith('.jsonl')
+        self.header = None
+        self.delimiter = delimiter
+        self.offsets = []  # 每行数据的(起始位置, 结束位置)
+        with open(path, 'rb') as f:
+            if self.is_csv and header:
+                self.header = next(csv.reader([f.readline().decode(encoding)], delimiter=delimiter), None)
+            start, quoted = f.tell(), False
+            for line in iter(f.readline, b''):
+                if self.is_csv:
+                    quoted ^= line.count(b'"') % 2 == 1  # 引号中的换行属于同一行数据
+                    if quoted:
+                        continue
+                end = f.tell()
+                if line.strip():
+                    self.offsets.append((start, end))
+                start = end
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def row(self, index):
+        start, end = self.offsets[index]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode(self.encoding)
+        if not self.is_csv:
+            return json.loads(text)
+        values = next(csv.reader(text.splitlines(True), delimiter=self.delimiter))
+        return dict(zip(self.header, values)) if self.header else values
+
+    def args(self, index):
+        return _call_args(self.row(index))
+
+    def name(self, index) -> str:
+        return str(index + 1)
+
+
+class LoadedFileSource(object):
+    """json/yaml数据文件, 无法按行读取, 整体解析一次后缓存, 文件内容应为列表"""
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        with open(path, encoding=encoding) as f:
+            if path.lower().endswith(('.yaml', '.yml')):
+                import yaml  # 可选依赖
+                self.rows = yaml.safe_load(f) or []
+            else:
+                self.rows = json.load(f)
+        assert isinstance(self.rows, list), '数据文件内容应为列表: %s' % path
+
+    def __len__(self):
+        return len(self.rows)
+
+    def args(self, index):
+        return _call_args(self.rows[index])
+
+    def name(self, index) -> str:
+        return str(index + 1)
+
+
+def resolve_path(path, owner):
+    """相对路径优先相对测试类所在的文件"""
+    if os.path.isabs(path):
+        return path
+    module = sys.modules.get(owner.__module__)
+    module_file = getattr(module, '__file__', None)
+    if module_file and os.path.exists(os.path.join(os.path.dirname(module_file), path)):
+        return os.path.join(os.path.dirname(module_file), path)
+    return path
+
+
+def get_data_files(module) -> list:
+    """模块中数据驱动用例使用的数据文件路径, 模块导入后才有记录"""
+    return sorted(_module_data_files.get(module, ()))
+
+
+def get_file_source(path, **options):
+    """数据文件对应的数据源, 以文件路径+mtime/大小缓存"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, tuple(sorted(options.items())))
+    with _sources_lock:
+        if key not in _sources:
+            if path.lower().endswith(('.csv', '.jsonl')):
+                _sources[key] = LineFileSource(path, **options)
+            else:
+                options.pop('header', None)
+                options.pop('delimiter', None)
+                _sources[key] = LoadedFileSource(path, **options)
+        return _sources[key]
+
+
+class DataDriven(object):
+    """数据驱动的用例方法, 定义测试类时按数据展开为多个用例方法(name_序号), 并删除原方法
+
+    展开时只记录数据的序号, 用例执行时才从数据源中读取对应的数据
+    """
+    def __init__(self, func, source):
+        self.func = func
+        self.source = source
+
+    def _make_test(self, index):
+        func, source = self.func, self.source
+
+        @wraps(func)
+        def test(case):
+            args, kwargs = source.args(index)
+            return func(case, *args, **kwargs)
+        extra = {key: value for key, value in vars(self).items() if key not in ('func', 'source')}
+        test.__dict__.update(extra)  # 数据装饰器之外的装饰器(如tag)设置的属性
+        return test
+
+    def __set_name__(self, owner, name):
+        source = self.source(owner) if callable(self.source) else self.source  # 相对路径以测试类所在文件为准
+        self.source = source
+        if getattr(source, 'path', None):  # 用例列表依赖数据文件
+            _module_data_files.setdefault(owner.__module__, set()).add(source.path)
+        for index in range(len(source)):
+            test_name = '%s_%s' % (name, source.name(index))
+            test = self._make_test(index)
+            test.__name__ = test_name
+            test.__qualname__ = '%s.%s' % (owner.__qualname__, test_name)
+            setattr(owner, test_name, test)
+        delattr(owner, name)
@@ -1,5 +1,7 @@
 from functools import wraps
 
+from htmlrunner.datasource import DataDriven, ValuesSource, TimesSource, get_file_source, resolve_path
+
 
 def tag(t: list):
     def _tag(func):
@@ -22,21 +24,40 @@ def order(o: int):
     return _order
 
 
-def rerun():
-    pass
+def rerun(n: int = 1):
+    """失败/出错/超时后最多重跑n次, 可用于用例方法或测试类"""
+    def _rerun(func):
+        func.reruns = n
+        return func
+    return _rerun
+
 
+def times(n: int):
+    """重复执行n次, 展开为name_1...name_n"""
+    def _times(func):
+        return DataDriven(func, TimesSource(n))
+    return _times
 
-def times():
-    pass
 
+def datafile(path: str, encoding='utf-8', **options):
+    """数据文件驱动, 每行/每项数据展开为一个用例
 
-def datafile():
-    pass
+    支持csv(首行为表头时每行作为关键字参数), jsonl, json(列表), yaml(列表, 需要安装PyYAML);
+    dict作为关键字参数, list作为位置参数; 相对路径优先相对测试类所在的文件
+    """
+    def _datafile(func):
+        return DataDriven(func, lambda owner: get_file_source(resolve_path(path, owner),
+                                                              encoding=encoding, **options))
+    return _datafile
 
 
-def csv():
-    pass
+def csv(path: str, encoding='utf-8', header=True, delimiter=','):
+    """csv数据文件驱动, header为True时首行为表头, 每行数据作为关键字参数, 否则作为位置参数"""
+    return datafile(path, encoding=encoding, header=header, delimiter=delimiter)
 
 
-def data():
-    pass
\ No newline at end of file
+def data(*values):
+    """数据驱动, 每个值作为一个参数传入, 展开为name_序号_值"""
+    def _data(func):
+        return DataDriven(func, ValuesSource(values))
+    return _data
@@ -0,0 +1,2 @@
+class ExecutionTimeout(Exception):
+    """用例执行超时"""
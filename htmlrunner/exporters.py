@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import zlib
+import struct
+import threading
+from array import array
+from datetime import datetime
+from xml.sax.saxutils import escape, quoteattr
+
+from htmlrunner.result import EventLog
+
+JSONLinesExporter = EventLog  # 事件日志即json lines格式的导出
+
+
+class Exporter(object):
+    """结果导出, 每个用例结束时即写入文件, 无需等待运行结束或渲染报告
+
+    start/finish在运行开始/结束时调用, add在每个用例结束时调用(可能来自多个线程);
+    final_only时每个用例只写入最终结果, 会重跑的失败用例在重跑结束后写入, 之前的执行记录在attempts中
+    """
+    final_only = True
+
+    def __init__(self, path):
+        self.path = path
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        self._file = open(path, 'wb')
+        self._lock = threading.Lock()
+
+    def start(self, result):
+        pass
+
+    def add(self, item):
+        raise NotImplementedError
+
+    def finish(self, result):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff￾￿]')
+
+JUNIT_COUNTS = ('tests', 'failures', 'errors', 'skipped')
+
+JUNIT_ELEMENTS = dict(FAIL='failure', XPASS='failure', ERROR='error', TIMEOUT='error',
+                      SKIPPED='skipped', XFAIL='skipped')  # 状态: 结果元素, 其他状态为通过
+
+JUNIT_RERUN_ELEMENTS = dict(failure='Failure', error='Error')  # 重跑前的执行记录: flaky/rerun + Failure/Error
+
+
+def _xml_text(text) -> str:
+    return escape(INVALID_XML_CHARS.sub('', str(text or '')))
+
+
+def _xml_attr(text) -> str:
+    return quoteattr(INVALID_XML_CHARS.sub('', str(text or '')))
+
+
+class JUnitXMLExporter(Exporter):
+    """JUnit XML格式, 逐个写入testcase; 统计数据在开始时写入定长的占位, 结束时回写"""
+    def start(self, result):
+        self.counts = dict.fromkeys(JUNIT_COUNTS, 0)
+        self.duration = 0.0
+        start_at = getattr(result, 'start_at', None) or datetime.now()
+        with self._lock:
+            self._file.write(b'<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n<testsuite name="htmlrunner" ')
+            self._counts_offset = self._file.tell()
+            self._file.write(self._counts_attrs().encode('utf-8'))
+            self._file.write(('timestamp=%s>\n' % _xml_attr(start_at.isoformat())).encode('utf-8'))
+
+    def _counts_attrs(self) -> str:
+        attrs = ''.join('%s="%010d" ' % (name, self.counts[name]) for name in JUNIT_COUNTS)
+        return attrs + 'time="%016.6f" ' % self.duration
+
+    def add(self, item):
+        duration = item['duration'].total_seconds() if item['duration'] is not None else 0.0
+        element = JUNIT_ELEMENTS.get(item['status'])
+        lines = ['<testcase classname=%s name=%s time="%.6f">' % (_xml_attr(item['test_class']),
+                                                                  _xml_attr(item['name']), duration)]
+        if element == 'skipped':
+            lines.append('<skipped message=%s/>' % _xml_attr(item['exec_info'] or item['status']))
+        elif element:
+            message = (item['exec_info'] or '').strip().rsplit('\n', 1)[-1]
+            lines.append('<%s type=%s message=%s>%s</%s>' % (element, _xml_attr(item['status']), _xml_attr(message),
+                                                             _xml_text(item['exec_info']), element))
+        for attempt in item['attempts'] or ():  # 与surefire一致, 最终通过为flaky, 仍然失败为rerun
+            suffix = JUNIT_RERUN_ELEMENTS.get(JUNIT_ELEMENTS.get(attempt['status']))
+            if suffix:
+                name = ('rerun' if element in JUNIT_RERUN_ELEMENTS else 'flaky') + suffix
+                message = (attempt['exec_info'] or '').strip().rsplit('\n', 1)[-1]
+                lines.append('<%s type=%s message=%s><stackTrace>%s</stackTrace></%s>' % (
+                    name, _xml_attr(attempt['status']), _xml_attr(message), _xml_text(attempt['exec_info']), name))
+        if item['output']:
+            lines.append('<system-out>%s</system-out>' % _xml_text(item['output']))
+        lines.append('</testcase>\n')
+        with self._lock:
+            self.counts['tests'] += 1
+            if element == 'failure':
+                self.counts['failures'] += 1
+            elif element == 'error':
+                self.counts['errors'] += 1
+            elif element == 'skipped':
+                self.counts['skipped'] += 1
+            self.duration += duration
+            self._file.write('\n'.join(lines).encode('utf-8'))
+
+    def finish(self, result):
+        with self._lock:
+            self._file.write(b'</testsuite>\n</testsuites>\n')
+            self._file.seek(self._counts_offset)
+            self._file.write(self._counts_attrs().encode('utf-8'))  # 定长, 不影响之后的内容
+        self.close()
+
+
+BINARY_MAGIC = b'HTRB'
+
+BINARY_VERSION = 1
+
+BINARY_CHUNK_SIZE = 1000  # 每个数据块的用例数
+
+# (字段, 类型): I为无符号整数, d为浮点数(None记为nan), dict为字典编码的字符串(适合重复值), str为字符串
+BINARY_COLUMNS = (('sn', 'I'), ('status', 'dict'), ('test_module', 'dict'), ('test_class', 'dict'),
+                  ('name', 'str'), ('full_path', 'str'), ('start_at', 'd'), ('duration', 'd'),
+                  ('exec_info', 'str'), ('output', 'str'))
+
+
+def _le_array(typecode, values) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == 'big':  # 统一使用小端序
+        data.byteswap()
+    return data.tobytes()
+
+
+def _read_le_array(typecode, buffer, pos, n):
+    data = array(typecode)
+    end = pos + data.itemsize * n
+    data.frombytes(buffer[pos:end])
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data, end
+
+
+def _pack_strings(values) -> bytes:
+    encoded = [(value or '').encode('utf-8') for value in values]
+    return _le_array('I', map(len, encoded)) + b''.join(encoded)
+
+
+def _unpack_strings(buffer, pos, n):
+    lengths, pos = _read_le_array('I', buffer, pos, n)
+    values = []
+    for length in lengths:
+        values.append(buffer[pos:pos + length].decode('utf-8'))
+        pos += length
+    return values, pos
+
+
+class BinaryExporter(Exporter):
+    """紧凑的列式二进制格式, 每BINARY_CHUNK_SIZE个用例按列编码为一个zlib压缩的数据块
+
+    文件格式: HTRB + 版本(1字节), 之后为多个数据块: 压缩后长度(4字节) + 用例数(4字节) + 压缩数据;
+    可用read_binary读取
+    """
+    def __init__(self, path, chunk_size=BINARY_CHUNK_SIZE):
+        super().__init__(path)
+        self.chunk_size = chunk_size
+        self._rows = []
+        with self._lock:
+            self._file.write(BINARY_MAGIC + bytes([BINARY_VERSION]))
+
+    def add(self, item):
+        row = []
+        for name, kind in BINARY_COLUMNS:
+            value = item[name]
+            if name == 'start_at':
+                value = value.timestamp() if value else float('nan')
+            elif name == 'duration':
+                value = value.total_seconds() if value is not None else float('nan')
+            row.append(value)
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.chunk_size:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        parts = []
+        for index, (name, kind) in enumerate(BINARY_COLUMNS):
+            values = [row[index] for row in rows]
+            if kind in ('I', 'd'):
+                parts.append(_le_array(kind, [value or 0 for value in values] if kind == 'I' else values))
+            elif kind == 'str':
+                parts.append(_pack_strings(values))
+            else:
+                uniques = list(dict.fromkeys(values))
+                positions = {value: i for i, value in enumerate(uniques)}
+                parts.append(struct.pack('<I', len(uniques)) + _pack_strings(uniques)
+                             + _le_array('I', (positions[value] for value in values)))
+        data = zlib.compress(b''.join(parts))
+        self._file.write(struct.pack('<II', len(data), len(rows)) + data)
+        self._file.flush()
+
+    def finish(self, result):
+        with self._lock:
+            self._write_chunk()
+        self.close()
+
+
+def read_binary(path):
+    """逐个读取BinaryExporter导出的用例数据, 时间为时间戳, 耗时为秒数(未执行为None)"""
+    with open(path, 'rb') as f:
+        header = f.read(len(BINARY_MAGIC) + 1)
+        assert header[:len(BINARY_MAGIC)] == BINARY_MAGIC, '不是htmlrunner二进制结果文件: %s' % path
+        assert header[-1] == BINARY_VERSION, '不支持的版本: %s' % header[-1]
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            length, n = struct.unpack('<II', chunk_header)
+            buffer = zlib.decompress(f.read(length))
+            pos, columns = 0, []
+            for name, kind in BINARY_COLUMNS:
+                if kind in ('I', 'd'):
+                    values, pos = _read_le_array(kind, buffer, pos, n)
+                    if kind == 'd':
+                        values = [None if value != value else value for value in values]  # nan
+                elif kind == 'str':
+                    values, pos = _unpack_strings(buffer, pos, n)
+                else:
+                    count, = struct.unpack_from('<I', buffer, pos)
+                    uniques, pos = _unpack_strings(buffer, pos + 4, count)
+                    indexes, pos = _read_le_array('I', buffer, pos, n)
+                    values = [uniques[i] for i in indexes]
+                columns.append(values)
+            for values in zip(*columns):
+                yield dict(zip((name for name, _ in BINARY_COLUMNS), values))
+
+
+EXPORTERS = {
+    '.xml': JUnitXMLExporter,
+    '.jsonl': JSONLinesExporter,
+    '.htrb': BinaryExporter,
+}
+
+
+def get_exporter(path):
+    """按文件扩展名创建导出: .xml为JUnit XML, .jsonl为json lines, .htrb为二进制格式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORTERS:
+        raise NotImplementedError('只支持%s格式' % ','.join(EXPORTERS))
+    return EXPORTERS[ext](path)
@@ -0,0 +1,128 @@
+import io
+import os
+import base64
+import hashlib
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from logz import log
+
+OUTPUT_DIR = '.'
+IMAGE_DIR = 'images'
+
+IMAGE_WORKERS = 4
+
+
+class ImageWriter(object):
+    """后台线程池保存用例图片, 登记用例时只计算文件名, 不等待图片的下载/写入
+
+    文件名为图片内容的sha1, 相同的截图只保存一次; file类型登记时即读取文件内容, 以免同一路径被后续用例覆盖,
+    url类型以url计算
+    """
+    def __init__(self, output=None, workers=IMAGE_WORKERS, thumbnail=None):
+        self.output = output or OUTPUT_DIR  # 报告目录, 图片保存在其下的images目录
+        self.image_dir = os.path.join(self.output, IMAGE_DIR)
+        self.workers = workers
+        self.thumbnail = thumbnail  # (宽, 高), 按比例缩小超过尺寸的图片并压缩, 需要安装Pillow
+        self._executor = None
+        self._futures = []
+        self._submitted = set()  # 已提交的文件名
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ext(path, default='.png'):
+        ext = os.path.splitext(urllib.parse.urlparse(path).path)[1]
+        return ext if 1 < len(ext) <= 5 else default
+
+    def _parse(self, img):
+        """返回(文件名, 读取方式, 数据), img为二元序列(类型, 图片)或图片文件路径"""
+        if isinstance(img, str):
+            img = ('file', img)
+        if not isinstance(img, (tuple, list)) or len(img) < 2:
+            log.error('images中每个需要是个二元序列')
+            return None
+        _type, _img = img
+        if _type == 'file':
+            if not os.path.isfile(_img):
+                log.error('图片文件不存在: %s' % _img)
+                return None
+            with open(_img, 'rb') as f:
+                image_bin = f.read()
+            return hashlib.sha1(image_bin).hexdigest() + self._ext(_img), 'bin', image_bin
+        if _type == 'base64':
+            image_bin = base64.b64decode(_img)
+        elif _type == 'bin':
+            image_bin = _img
+        elif _type == 'url':
+            return hashlib.sha1(_img.encode('utf-8')).hexdigest() + self._ext(_img), 'url', _img
+        else:
+            raise NotImplementedError('只支持file,base64,bin,url格式')
+        return hashlib.sha1(image_bin).hexdigest() + '.png', 'bin', image_bin
+
+    def submit(self, img):
+        """提交一张图片, 返回图片相对报告目录的路径, 无效的图片返回None"""
+        parsed = self._parse(img)
+        if parsed is None:
+            return None
+        file_name, _type, data = parsed
+        with self._lock:
+            if file_name not in self._submitted:
+                self._submitted.add(file_name)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='htmlrunner-image')
+                self._futures.append(self._executor.submit(self._write, file_name, _type, data))
+        return '%s/%s' % (IMAGE_DIR, file_name)
+
+    def save(self, images) -> list:
+        """提交用例的所有图片, 返回有效图片的路径"""
+        return [path for path in map(self.submit, images) if path]
+
+    def _shrink(self, image_bin):
+        try:
+            from PIL import Image
+        except ImportError:
+            log.warning('生成缩略图需要安装Pillow: pip install pillow')
+            self.thumbnail = None
+            return image_bin
+        image = Image.open(io.BytesIO(image_bin))
+        image.thumbnail(self.thumbnail)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image.format or 'PNG', optimize=True)
+        return buffer.getvalue()
+
+    def _write(self, file_name, _type, data):
+        image_file = os.path.join(self.image_dir, file_name)
+        if os.path.exists(image_file):  # 其他进程或之前的运行已保存
+            return image_file
+        if _type == 'url':
+            with urllib.request.urlopen(data) as res:
+                image_bin = res.read()
+        else:
+            image_bin = data
+        if self.thumbnail:
+            image_bin = self._shrink(image_bin)
+        os.makedirs(self.image_dir, exist_ok=True)
+        tmp_file = '%s.%s.tmp' % (image_file, threading.get_ident())
+        with open(tmp_file, 'wb') as f:
+            f.write(image_bin)
+        os.replace(tmp_file, image_file)
+        return image_file
+
+    def wait(self):
+        """等待已提交的图片全部保存完成"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                log.error('保存图片失败: %s' % future.exception())
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
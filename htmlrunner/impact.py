@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import threading
+from contextlib import contextmanager
+
+COVERAGE_VERSION = 1
+
+HTMLRUNNER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EXCLUDED_DIRS = ('site-packages', 'dist-packages')
+
+
+class CoverageMap(object):
+    """用例覆盖的源码行, 以test.id()为键持久化为json文件, 用于只选择受修改文件影响的用例
+
+    用例开始到结束之间通过sys.settrace记录当前线程执行的root目录下的源码行(不含site-packages及htmlrunner自身),
+    用例中新建的线程及共享事件循环中的异步用例不记录; Runner执行的setUpClass等测试类夹具记录在测试类id(module.Class)下,
+    对测试类中的所有用例生效
+    """
+    def __init__(self, path=None, root=None):
+        self.path = path
+        self.tests = {}  # 用例id: {文件路径: [行号]}
+        self._tracked = {}  # 代码文件名: 是否记录
+        self._by_file = None
+        self._local = threading.local()  # 当前线程正在记录的(key, 执行的源码行, 之前的trace函数)
+        data = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except ValueError:  # 文件损坏时重新记录
+                data = {}
+            if data.get('version') != COVERAGE_VERSION:
+                data = {}
+        # 只记录该目录下的源码, 路径保存为相对root的路径; 默认沿用记录文件中的root, 没有时为当前目录
+        self.root = os.path.abspath(root or data.get('root') or os.getcwd())
+        if data.get('root') == self.root:
+            self.tests = data['tests']
+
+    def __getstate__(self):  # 传给子进程时不带已有的记录, 子进程中的记录随结果返回, 由主进程保存
+        state = dict(self.__dict__, path=None, tests={}, _by_file=None)
+        state.pop('_local')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _is_tracked(self, filename) -> bool:
+        tracked = self._tracked.get(filename)
+        if tracked is None:
+            path = os.path.abspath(filename)
+            tracked = self._tracked[filename] = (
+                path.startswith(self.root + os.sep) and os.path.isfile(path)
+                and not path.startswith(HTMLRUNNER_DIR + os.sep)
+                and not any(name in path.split(os.sep) for name in EXCLUDED_DIRS))
+        return tracked
+
+    def _relpath(self, path) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def start(self, key):
+        """开始记录当前线程中执行的源码行"""
+        self.stop()
+        files = {}
+        is_tracked = self._is_tracked
+
+        def trace_lines(frame, event, arg):
+            if event == 'line':
+                files[frame.f_code.co_filename].add(frame.f_lineno)
+            return trace_lines
+
+        def trace_calls(frame, event, arg):
+            filename = frame.f_code.co_filename
+            if event == 'call' and is_tracked(filename):
+                files.setdefault(filename, set()).add(frame.f_lineno)
+                return trace_lines
+            return None
+
+        self._local.state = (key, files, sys.gettrace())
+        sys.settrace(trace_calls)
+
+    def stop(self):
+        """结束记录, 保存为start时key的覆盖记录"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            return
+        key, files, old_trace = state
+        self._local.state = None
+        sys.settrace(old_trace)
+        self.record(key, files)
+
+    @contextmanager
+    def trace(self, key):
+        self.start(key)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def record(self, test_id, files):
+        """files为{文件名: 行号集合}, 同一用例再次执行时(如重跑)合并记录"""
+        lines = self.tests.setdefault(test_id, {})
+        for filename, file_lines in files.items():
+            path = self._relpath(filename)
+            lines[path] = sorted(set(lines.get(path, ())) | file_lines)
+        self._by_file = None
+
+    def update(self, tests):
+        """合并子进程中的覆盖记录"""
+        self.tests.update(tests)
+        self._by_file = None
+
+    def _build_by_file(self):
+        self._by_file = {}
+        for test_id, files in self.tests.items():
+            for path in files:
+                self._by_file.setdefault(path, []).append(test_id)
+        return self._by_file
+
+    def select(self, changed_files, test_ids=None) -> list:
+        """受修改文件影响的用例id
+
+        changed_files为修改的文件路径列表, 或{文件路径: 修改的行号}只选择执行过修改行的用例;
+        test_ids为所有用例id(如Loader.test_ids), 其中没有覆盖记录的用例(如新增用例)也会选择;
+        修改了非py文件(如数据文件, 配置)时无法判断影响范围, 选择所有用例
+        """
+        if isinstance(changed_files, dict):
+            changed = {self._relpath(path): set(lines) for path, lines in changed_files.items()}
+        else:
+            changed = {self._relpath(path): None for path in changed_files}
+        if any(not path.endswith('.py') for path in changed):
+            return list(test_ids) if test_ids is not None else list(self.tests)
+
+        by_file = self._by_file if self._by_file is not None else self._build_by_file()
+        affected = set()
+        for path, lines in changed.items():
+            for test_id in by_file.get(path, ()):
+                if lines is None or lines.intersection(self.tests[test_id][path]):
+                    affected.add(test_id)
+        if test_ids is None:
+            return sorted(affected)
+        selected = []
+        for test_id in test_ids:
+            class_id = test_id.rsplit('.', 1)[0]
+            if test_id in affected or class_id in affected or test_id not in self.tests:
+                selected.append(test_id)
+        return selected
+
+    def save(self):
+        if not self.path:
+            return
+        dir_name = os.path.dirname(self.path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(version=COVERAGE_VERSION, root=self.root, tests=self.tests), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,284 @@
+import os
+import re
+import ast
+import json
+from fnmatch import fnmatch
+
+from htmlrunner.utils import get_case_meta, TAG_PARTTEN, LEVEL_PARTTEN, ORDER_PARTTEN, DEFAULT_LEVEL, DEFAULT_ORDER
+
+INDEX_VERSION = 3
+
+VALID_MODULE_NAME = re.compile(r'[_a-z]\w*\.py$', re.IGNORECASE)
+
+TEST_CASE_BASES = {'TestCase', 'IsolatedAsyncioTestCase'}  # unittest中的用例基类
+
+META_DECORATORS = {'tag', 'level', 'order'}  # 设置用例属性的装饰器, 参数需为字面量
+
+PLAIN_DECORATORS = {'skip', 'skipIf', 'skipUnless', 'expectedFailure', 'rerun'}  # 不影响用例列表及属性的装饰器
+
+STATIC_MODULE_NODES = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+                       ast.Assign, ast.AnnAssign, ast.Expr)
+
+
+def find_test_files(start_dir, pattern='test*.py', top_level_dir=None):
+    """按unittest discover的规则查找测试文件, 返回[(文件路径, 模块名)]"""
+    start_dir = os.path.abspath(start_dir)
+    top_level_dir = os.path.abspath(top_level_dir or start_dir)
+    test_files = []
+    for dirpath, dirnames, filenames in os.walk(start_dir):
+        # 与discover一致, 只进入包含__init__.py的子目录
+        dirnames[:] = sorted(name for name in dirnames
+                             if os.path.isfile(os.path.join(dirpath, name, '__init__.py')))
+        for filename in sorted(filenames):
+            if not VALID_MODULE_NAME.match(filename) or not fnmatch(filename, pattern):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            module = os.path.splitext(os.path.relpath(file_path, top_level_dir))[0].replace(os.sep, '.')
+            test_files.append((file_path, module))
+    return test_files
+
+
+class _Dynamic(Exception):
+    """无法静态确定测试文件中的用例, 需要导入"""
+
+
+def _name_of(node) -> str:
+    """Name/Attribute/Call节点的名称, 如unittest.skip(...)为skip"""
+    if isinstance(node, ast.Call):
+        node = node.func
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    raise _Dynamic()
+
+
+def _target_names(target) -> list:
+    """赋值目标中的名称, 如a, (B, c)"""
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for item in target.elts for name in _target_names(item)]
+    if isinstance(target, ast.Starred):
+        return _target_names(target.value)
+    return [target.id] if isinstance(target, ast.Name) else []
+
+
+def _is_literal(node) -> bool:
+    try:
+        ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return False
+    return True
+
+
+def _method_meta(node) -> tuple:
+    """与get_case_meta一致, 装饰器的设置优先于docstring"""
+    doc = ast.get_docstring(node, clean=False) or ''
+    tags = TAG_PARTTEN.findall(doc) if 'tag' in doc else []
+    level = order = None
+    for decorator in node.decorator_list:
+        name = _name_of(decorator)
+        if name in PLAIN_DECORATORS:
+            continue
+        if name not in META_DECORATORS or not isinstance(decorator, ast.Call) or len(decorator.args) != 1:
+            raise _Dynamic()  # 其他装饰器(如数据驱动)可能改变用例
+        try:
+            value = ast.literal_eval(decorator.args[0])
+        except ValueError:
+            raise _Dynamic()
+        if name == 'tag':
+            for tag in [value] if isinstance(value, str) else value:
+                if tag not in tags:
+                    tags.append(tag)
+        elif name == 'level':
+            level = value
+        else:
+            order = value
+    if level is None:
+        levels = LEVEL_PARTTEN.findall(doc)
+        level = int(levels[0]) if levels else DEFAULT_LEVEL
+    if order is None:
+        orders = ORDER_PARTTEN.findall(doc)
+        order = int(orders[0]) if orders else DEFAULT_ORDER
+    return tags, level, order
+
+
+def parse_test_file(file_path, module, prefix='test') -> list:
+    """不导入测试文件, 通过解析语法树得到用例id及tags/level/order, 格式同TestIndex中的用例
+
+    只处理直接或经本文件中的类继承unittest.TestCase的测试类; 有无法静态确定的写法时返回None, 需要导入:
+    load_tests, 数据驱动等其他装饰器, 继承自其他模块的类, 导入名称含Test/Case的类, import *,
+    模块级的循环/条件等语句, 值为调用或目标名称首字母大写(可能是生成的测试类)的模块级赋值(字面量除外);
+    与loadTestsFromModule一致, 测试类按类名排序
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            tree = ast.parse(f.read(), file_path)
+    except (SyntaxError, ValueError):  # 导入时报告错误
+        return None
+    try:
+        classes = {}  # 类名: (是否为测试类, {方法名: 方法节点})
+        tests = {}  # 测试类名: 用例
+        for node in tree.body:
+            if isinstance(node, ast.If) and isinstance(node.test, ast.Compare) \
+                    and getattr(node.test.left, 'id', None) == '__name__':
+                continue  # if __name__ == '__main__'
+            if not isinstance(node, STATIC_MODULE_NODES):
+                raise _Dynamic()
+            if isinstance(node, ast.Expr) and not isinstance(node.value, ast.Constant):
+                raise _Dynamic()  # 模块级的函数调用
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == 'load_tests':
+                raise _Dynamic()
+            if isinstance(node, ast.ImportFrom) and node.module != 'unittest' \
+                    and any(re.search('Test|Case', alias.asname or alias.name) for alias in node.names):
+                raise _Dynamic()  # 导入的测试类也会被加载
+            if isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names):
+                raise _Dynamic()
+            if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                if isinstance(node.value, ast.Call) or (
+                        any(name[:1].isupper() for target in targets for name in _target_names(target))
+                        and not _is_literal(node.value)):
+                    raise _Dynamic()  # TestX = make_case(...), TestY = TestX
+            if not isinstance(node, ast.ClassDef):
+                continue
+            if node.keywords or any(_name_of(decorator) not in PLAIN_DECORATORS for decorator in node.decorator_list):
+                raise _Dynamic()  # 元类, 类装饰器(如ddt)
+            is_test, methods = False, {}
+            for base in reversed(node.bases):
+                name = _name_of(base)
+                if name in classes:
+                    is_test = is_test or classes[name][0]
+                    methods.update(classes[name][1])
+                elif name in TEST_CASE_BASES:
+                    is_test = True
+                elif name != 'object':
+                    raise _Dynamic()
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    methods[item.name] = item
+                elif isinstance(item, (ast.Assign, ast.AnnAssign)):
+                    targets = item.targets if isinstance(item, ast.Assign) else [item.target]
+                    if any(getattr(target, 'id', '').startswith(prefix) for target in targets):
+                        raise _Dynamic()  # test_x = ...
+            classes[node.name] = (is_test, methods)
+            tests.pop(node.name, None)  # 同名的类以最后定义的为准
+            if is_test:
+                tests[node.name] = [['%s.%s.%s' % (module, node.name, name), *_method_meta(methods[name])]
+                                    for name in sorted(name for name in methods if name.startswith(prefix))]
+        return [entry for name in sorted(tests) for entry in tests[name]]
+    except _Dynamic:
+        return None
+
+
+class TestIndex(object):
+    """用例索引, 以文件路径+mtime/大小为键缓存每个测试文件中的用例id及tags/level/order, 可持久化为json文件
+
+    数据驱动的用例id取决于数据文件, 同时记录测试文件使用的数据文件的mtime/大小, 数据文件修改后重新导入
+
+    by_tag/by_level/orders在首次访问时由索引一次构建, 按tag或level筛选用例时无需遍历和导入用例
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.files = {}  # 文件路径: {mtime, size, module, tests: [[id, tags, level, order]], data: [[路径, mtime, size]]}
+        self._lookup = None
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except ValueError:  # 索引文件损坏时重建
+                data = {}
+            if data.get('version') == INDEX_VERSION:
+                self.files = data['files']
+
+    @staticmethod
+    def _stat(file_path):
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_fresh(self, file_path) -> bool:
+        """文件及其使用的数据文件自上次索引后未修改"""
+        entry = self.files.get(file_path)
+        if entry is None or (entry['mtime'], entry['size']) != self._stat(file_path):
+            return False
+        return all(os.path.isfile(path) and (mtime, size) == self._stat(path)
+                   for path, mtime, size in entry.get('data', ()))
+
+    def update(self, file_path, module, tests, data_files=()):
+        """更新文件中的用例, tests为用例对象列表, data_files为数据驱动用例使用的数据文件"""
+        self.update_entries(file_path, module, [[test.id(), *get_case_meta(test)] for test in tests], data_files)
+
+    def update_entries(self, file_path, module, entries, data_files=()):
+        """更新文件中的用例, entries为[用例id, tags, level, order]列表"""
+        mtime, size = self._stat(file_path) if os.path.isfile(file_path) else (None, None)
+        data = [[path, *self._stat(path)] for path in data_files if os.path.isfile(path)]
+        self.files[file_path] = dict(mtime=mtime, size=size, module=module, tests=entries, data=data)
+        self._lookup = None
+
+    def retain(self, file_paths):
+        """只保留指定文件的索引, 删除已不存在的测试文件"""
+        file_paths = set(file_paths)
+        self.files = {path: entry for path, entry in self.files.items() if path in file_paths}
+        self._lookup = None
+
+    def _build_lookup(self):
+        by_tag, by_level, orders, modules, positions = {}, {}, {}, {}, {}
+        for entry in self.files.values():
+            for test_id, tags, level, order in entry['tests']:
+                for tag in tags:
+                    by_tag.setdefault(tag, []).append(test_id)
+                by_level.setdefault(level, []).append(test_id)
+                orders[test_id] = order
+                modules[test_id] = entry['module']
+                positions[test_id] = len(positions)
+        self._lookup = dict(by_tag=by_tag, by_level=by_level, orders=orders, modules=modules,
+                            positions=positions)
+        return self._lookup
+
+    @property
+    def lookup(self) -> dict:
+        return self._lookup or self._build_lookup()
+
+    @property
+    def test_ids(self) -> list:
+        return list(self.lookup['orders'])
+
+    @property
+    def modules(self) -> dict:
+        """用例id: 模块名"""
+        return self.lookup['modules']
+
+    @property
+    def by_tag(self) -> dict:
+        """tag: [用例id]"""
+        return self.lookup['by_tag']
+
+    @property
+    def by_level(self) -> dict:
+        """level: [用例id]"""
+        return self.lookup['by_level']
+
+    @property
+    def orders(self) -> dict:
+        """用例id: order"""
+        return self.lookup['orders']
+
+    def _in_index_order(self, test_ids) -> list:
+        return sorted(set(test_ids), key=self.lookup['positions'].get)
+
+    def select_by_tags(self, tags) -> list:
+        """包含任一tag的用例id"""
+        return self._in_index_order(test_id for tag in tags for test_id in self.by_tag.get(tag, []))
+
+    def select_by_level(self, level) -> list:
+        """level在0到指定level之间的用例id"""
+        return self._in_index_order(test_id for case_level, test_ids in self.by_level.items()
+                                    if 0 <= case_level <= level for test_id in test_ids)
+
+    def save(self):
+        if not self.path:
+            return
+        dir_name = os.path.dirname(self.path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(dict(version=INDEX_VERSION, files=self.files), f, ensure_ascii=False)
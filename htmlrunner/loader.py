@@ -1,16 +1,28 @@
 import unittest
 import os
+import sys
+import json
 import time
+import importlib
+from datetime import datetime
 
-from htmlrunner.utils import isnotsuite, flatten_suite, group_test_by_class, get_case_level, get_case_order, get_case_tags
+from htmlrunner.index import TestIndex, find_test_files, parse_test_file
+from htmlrunner.datasource import get_data_files
+from htmlrunner.utils import isnotsuite, flatten_suite, copy_suite, group_test_by_class, get_case_order
 
 
 class Loader(object):  # suite factory
-    def __init__(self, testspath='.', pattern='test*.py', suite=None):
-        self._loader = unittest.defaultTestLoader
+    def __init__(self, testspath='.', pattern='test*.py', suite=None, cache_file=None, static=False):
+        self._loader = unittest.TestLoader()  # 不共用defaultTestLoader, 其discover会沿用上次的顶层目录
         self._suite = suite
         self._testspath = testspath
         self._pattern = pattern
+        self._cache_file = cache_file  # 用例索引文件, 未修改的测试文件无需重新导入
+        self._static = static  # 解析语法树得到用例, 不导入测试文件, 无法静态确定时才导入
+        self.collect_time = None  # 建立用例索引的耗时
+        self._discovered = None
+        self._tests = None
+        self._index = None
 
     @property
     def suite(self):
@@ -18,52 +30,211 @@ class Loader(object):  # suite factory
         if self._suite:
             assert isinstance(self._suite, unittest.TestSuite)
             return self._suite
-        return self._loader.discover(self._testspath, self._pattern)
+        if self._discovered is None:
+            self._discovered = self._loader.discover(self._testspath, self._pattern)
+        return copy_suite(self._discovered)  # 运行时会清空suite中的用例, 返回副本
 
-    @property  # todo 缓存
+    @property
+    def tests(self) -> list:
+        """所有用例对象"""
+        if self._tests is None:
+            self._tests = list(flatten_suite(self.suite))
+        return self._tests
+
+    @property
     def fsuite(self):
         """flatten后的suite,所有用例在同一层"""
-        return flatten_suite(self.suite)
+        return unittest.TestSuite(self.tests)
 
     @property
     def gsuite(self):
         """按测试类整理,每个测试类是一个单独的suite"""
-        return group_test_by_class(self.suite)  # todo 直接使用self.fsuite
+        return group_test_by_class(self.fsuite)
 
     @property
     def osuite(self):
         """按order整理顺序"""
+        return self.order_suite(self.fsuite)
+
+    @staticmethod
+    def order_suite(suite) -> unittest.TestSuite:
+        """按测试类整理, 测试类中的用例按order排列, 如筛选后加载的用例"""
         return unittest.TestSuite(
                 [unittest.TestSuite(
                     sorted(suite, key=lambda case: get_case_order(case))
                 )
-                 for suite in self.gsuite])
+                 for suite in group_test_by_class(suite)])
+
+    def psuite(self, last_run=None, suite=None) -> unittest.TestSuite:
+        """按上次运行结果调整顺序, 尽快发现失败: 上次失败/出错的测试类最先执行, 其次是上次运行后修改过模块的测试类
+
+        last_run为上次运行的事件日志, 以测试类为单位调整顺序, 测试类中的用例仍按order排列; 配合failfast使用;
+        suite为筛选后的用例, 默认为所有用例
+        """
+        from htmlrunner.result import EventLog, FAILED_STATUSES  # 收集用例时无需导入
+
+        failed, last_start = set(), None
+        if last_run and os.path.isfile(last_run):
+            statuses = {}
+            for event in EventLog.read(last_run)[0]:
+                if event['event'] == 'start':
+                    last_start = datetime.fromisoformat(event['start_at']).timestamp()
+                elif event['event'] == 'test':
+                    statuses[event['full_path']] = event['status']
+            failed = {test_id for test_id, status in statuses.items() if status in FAILED_STATUSES}
+
+        changed = {}  # 模块名: 上次运行后是否修改过
+
+        def is_changed(module_name):
+            if module_name not in changed:
+                file_path = getattr(sys.modules.get(module_name), '__file__', None)
+                changed[module_name] = bool(last_start and file_path and os.path.isfile(file_path)
+                                            and os.path.getmtime(file_path) > last_start)
+            return changed[module_name]
+
+        def priority(suite):
+            tests = list(suite)
+            if any(test.id() in failed for test in tests):
+                return 0
+            if any(is_changed(test.__class__.__module__) for test in tests):
+                return 1
+            return 2
+
+        ordered = self.osuite if suite is None else self.order_suite(suite)
+        return unittest.TestSuite(sorted(ordered, key=priority))  # 稳定排序, 同一优先级保持原顺序
+
+    @property
+    def index(self) -> TestIndex:
+        """用例索引, 设置cache_file时只重新导入修改过的测试文件"""
+        if self._index is None:
+            t0 = time.time()
+            if (self._cache_file or self._static) and not self._suite:
+                self._index = self._build_index()
+            else:
+                self._index = TestIndex()
+                modules = {}
+                for test in self.tests:
+                    modules.setdefault(test.__class__.__module__, []).append(test)
+                for module_name, tests in modules.items():
+                    module = sys.modules.get(module_name)
+                    self._index.update(getattr(module, '__file__', None) or module_name, module_name, tests)
+            self.collect_time = time.time() - t0
+        return self._index
 
-    def collect_only(self, suite: unittest.TestSuite) -> None:
+    def _add_top_level_dir(self):
+        top_level_dir = os.path.abspath(self._testspath)
+        if top_level_dir not in sys.path:
+            sys.path.insert(0, top_level_dir)
+
+    def _build_index(self) -> TestIndex:
+        index = TestIndex(self._cache_file)
+        self._add_top_level_dir()
+        test_files = find_test_files(self._testspath, self._pattern)
+        for file_path, module_name in test_files:
+            if index.is_fresh(file_path):
+                continue
+            entries = parse_test_file(file_path, module_name) if self._static else None
+            if entries is not None:
+                index.update_entries(file_path, module_name, entries)
+                continue
+            tests = list(flatten_suite(self._loader.loadTestsFromName(module_name)))
+            if any(isinstance(test, unittest.loader._FailedTest) for test in tests):
+                index.files.pop(file_path, None)  # 导入失败的文件不缓存
+                continue
+            index.update(file_path, module_name, tests, get_data_files(module_name))
+        index.retain(file_path for file_path, _ in test_files)
+        index.save()
+        return index
+
+    @property
+    def test_ids(self) -> list:
+        return self.index.test_ids
+
+    def load(self, test_ids) -> unittest.TestSuite:
+        """按用例id加载用例, 只导入用例所在的模块; 尚未建立用例索引时直接按id(module.Class.method)加载"""
+        suite = unittest.TestSuite()
+        if self._tests is not None or self._suite:
+            tests = {test.id(): test for test in self.tests}
+            suite.addTests(tests[test_id] for test_id in test_ids if test_id in tests)
+            return suite
+        if self._index is None and not self._cache_file:  # 不为加载少量用例建立索引
+            self._add_top_level_dir()
+            modules = {}
+        else:
+            modules = self.index.modules
+        for test_id in test_ids:
+            module_name = modules.get(test_id)
+            if module_name:
+                module = importlib.import_module(module_name)
+                suite.addTests(self._loader.loadTestsFromName(test_id[len(module_name) + 1:], module))
+            else:
+                suite.addTests(self._loader.loadTestsFromName(test_id))
+        return flatten_suite(suite)
+
+    def collect_only(self, suite: unittest.TestSuite = None, test_ids: list = None, fmt='text') -> int:
+        """列出用例, 返回用例数
+
+        fmt: text为带序号的列表, ids为每行一个用例id, jsonl为每行一个json(id/tags/level/order), 后两种可流式处理
+        """
         t0 = time.time()
-        i = 0
-        print("Collect {} tests is {:.3f}s".format(suite.countTestCases(), time.time() - t0))
-        print("-" * 50)
-        for case in self.fsuite:
-            if isnotsuite(case):  # todo remove
-                i += 1
-                print("{}.{}".format(i, str(case)))
-        print("-" * 50)
-
-    def collect_by_list(self, testlist_file: str) -> unittest.TestSuite:  # todo 直接load
-        """通过配置文件筹集用例"""
+        if test_ids is None:
+            test_ids = self.test_ids if suite is None else [test.id() for test in flatten_suite(suite)]
+        if fmt == 'text':
+            collect_time = self.collect_time if self.collect_time is not None else time.time() - t0
+            print("Collect {} tests is {:.3f}s".format(len(test_ids), collect_time))
+            print("-" * 50)
+            for i, test_id in enumerate(test_ids, 1):
+                print("{}.{}".format(i, test_id))
+            print("-" * 50)
+        elif fmt == 'ids':
+            for test_id in test_ids:
+                print(test_id)
+        elif fmt == 'jsonl':
+            lookup = self.index.lookup
+            tags = {}
+            for tag, ids in lookup['by_tag'].items():
+                for test_id in ids:
+                    tags.setdefault(test_id, []).append(tag)
+            levels = {test_id: level for level, ids in lookup['by_level'].items() for test_id in ids}
+            for test_id in test_ids:
+                print(json.dumps(dict(id=test_id, tags=tags.get(test_id, []), level=levels.get(test_id),
+                                      order=lookup['orders'].get(test_id)), ensure_ascii=False))
+        else:
+            raise NotImplementedError('只支持text,ids,jsonl格式')
+        return len(test_ids)
+
+    def select_by_list(self, testlist_file: str) -> list:
+        """用例列表文件中的用例id, 按文件中的顺序: 完整id(module.Class.method)直接使用, 只有方法名时从用例索引中匹配"""
         assert isinstance(testlist_file, str)
         assert os.path.isfile(testlist_file)
 
         with open(testlist_file) as f:
-            testlist = f.readlines()
+            testlist = [line.strip() for line in f if line.strip() and not line.startswith("#")]
 
-        testlist = set([i.strip() for i in testlist if not i.startswith("#")])
-        suite = unittest.TestSuite()
-        for case in self.fsuite:
-            if case._testMethodName in testlist:
-                suite.addTest(case)
-        return suite
+        names = {name for name in testlist if '.' not in name}
+        matched = {}
+        if names:
+            for test_id in self.test_ids:
+                matched.setdefault(test_id.rsplit('.', 1)[-1], []).append(test_id)
+        test_ids = []
+        for name in testlist:
+            test_ids.extend(matched.get(name, []) if name in names else [name])
+        return list(dict.fromkeys(test_ids))
+
+    def collect_by_list(self, testlist_file: str) -> unittest.TestSuite:
+        """通过配置文件筹集用例, 只导入列出的用例所在的模块"""
+        return self.load(self.select_by_list(testlist_file))
+
+    def select_by_changes(self, changed_files, coverage_map) -> list:
+        """受修改文件影响的用例id, coverage_map为之前运行记录的用例覆盖记录(CoverageMap或文件路径)"""
+        if isinstance(coverage_map, str):
+            from htmlrunner.impact import CoverageMap
+            coverage_map = CoverageMap(coverage_map)
+        return coverage_map.select(changed_files, self.test_ids)
+
+    def collect_by_changes(self, changed_files, coverage_map) -> unittest.TestSuite:
+        """只筹集受修改文件影响的用例"""
+        return self.load(self.select_by_changes(changed_files, coverage_map))
 
     def collect_by_dirs(self, dirs: list, pattern='test*.py') -> unittest.TestSuite:
         suites = []
@@ -74,22 +245,9 @@ class Loader(object):  # suite factory
 
     def collect_by_tags(self, tags: list) -> unittest.TestSuite:  # todo 支持自定义suite
         assert isinstance(tags, list)
-        new_suite = unittest.TestSuite()
-        for case in self.fsuite:
-            case_tags = get_case_tags(case)
-            for tag in tags:
-                if tag in case_tags:
-                    new_suite.addTest(case)
-                    break
-        return new_suite
+        return self.load(self.index.select_by_tags(tags))
 
     def collect_by_level(self, level: int) -> unittest.TestSuite:
         """收集小于等于指定level的用例"""
         assert isinstance(level, int)
-        new_suite = unittest.TestSuite()
-        for case in self.fsuite:
-            case_level = get_case_level(case)
-            if 0 <= case_level <= level:  # 如果用例实际level <= 目标level，则运行
-                new_suite.addTest(case)
-        return new_suite
-
+        return self.load(self.index.select_by_level(level))  # 如果用例实际level <= 目标level，则运行
@@ -0,0 +1,77 @@
+"""合并多个分片(如多台CI机器)的运行结果, 生成一份报告
+
+每个分片运行时需指定event_log, 合并时只读取事件日志, 不重新执行用例:
+    python -m htmlrunner.merge shard1/report.jsonl shard2/report.jsonl -o merged/report.html
+"""
+import os
+import sys
+import shutil
+import argparse
+
+from htmlrunner.images import IMAGE_DIR
+from htmlrunner.result import Result, EventLog
+
+
+def merge_results(paths) -> Result:
+    """按分片顺序合并事件日志, 序号按合并顺序重新编排; 同一用例出现在多个分片中时以后面的为准
+
+    开始时间取各分片最早的开始时间, 结束时间取最晚的结束时间
+    """
+    result = Result()
+    start_times, end_times, interrupted = [], [], False
+    for path in paths:
+        result.start_at = result.end_at = None
+        result.apply_events(EventLog.read(path)[0])
+        if result.start_at:
+            start_times.append(result.start_at)
+        if result.end_at:
+            end_times.append(result.end_at)
+        else:
+            interrupted = True
+    if interrupted:  # 有分片运行中断, 同时参考用例的结束时间
+        end_times.extend(item.end_at for item in result.result.values() if item.end_at)
+    result.start_at = min(start_times) if start_times else None
+    result.end_at = max(end_times) if end_times else result.start_at
+    return result
+
+
+def copy_images(paths, output):
+    """复制各分片的用例图片到合并报告目录, 图片文件名为内容的sha1, 不会冲突"""
+    image_dir = os.path.join(output or '.', IMAGE_DIR)
+    for path in paths:
+        shard_image_dir = os.path.join(os.path.dirname(os.path.abspath(path)), IMAGE_DIR)
+        if not os.path.isdir(shard_image_dir) or os.path.abspath(shard_image_dir) == os.path.abspath(image_dir):
+            continue
+        os.makedirs(image_dir, exist_ok=True)
+        for file_name in os.listdir(shard_image_dir):
+            if not os.path.exists(os.path.join(image_dir, file_name)):
+                shutil.copyfile(os.path.join(shard_image_dir, file_name), os.path.join(image_dir, file_name))
+
+
+def merge(paths, report_file=None, output=None, **kwargs) -> Result:
+    """合并分片的事件日志并生成报告, kwargs为HTMLRunner的报告参数(title, template, lazy等)"""
+    from htmlrunner.runner import HTMLRunner
+    runner = HTMLRunner(report_file=report_file, output=output, **kwargs)
+    result = merge_results(paths)
+    copy_images(paths, output)
+    runner.generate_report(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合并多个分片的事件日志, 生成一份报告')
+    parser.add_argument('paths', nargs='+', help='各分片的事件日志(json lines)')
+    parser.add_argument('-o', '--report-file', help='报告文件')
+    parser.add_argument('--output', help='报告目录')
+    parser.add_argument('--title', help='报告标题')
+    parser.add_argument('--template', help='报告模板')
+    parser.add_argument('--lazy', action='store_true', help='分页报告')
+    args = parser.parse_args(argv)
+    result = merge(args.paths, report_file=args.report_file, output=args.output, title=args.title,
+                   template=args.template, lazy=args.lazy)
+    print('合并%s个分片, 共%s个用例' % (len(args.paths), len(result.result)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,44 +1,100 @@
 import sys
 import io
 import os
+import json
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
-from itertools import groupby
+import heapq
 import inspect
 import importlib
-import base64
+import threading
 import platform
-from random import randint
-import urllib.request
 from enum import Enum
+from contextvars import ContextVar
 
 from logz import log
 
-from htmlrunner.utils import flatten_suite, get_case_tags, get_case_level, get_case_order, get_case_images
+from htmlrunner.exceptions import ExecutionTimeout
+from htmlrunner.images import ImageWriter, OUTPUT_DIR, IMAGE_DIR  # noqa
+from htmlrunner.utils import flatten_suite, get_case_meta, get_case_images, SourceRef
 
-OUTPUT_DIR = '.'
-IMAGE_DIR = 'images'
+
+
+_output_buffer = ContextVar('htmlrunner_output_buffer', default=None)  # 当前线程/协程的输出缓冲
+
+_redirector_lock = threading.Lock()
+
+_capturing = []  # 正在捕获输出的(缓冲, 开始捕获时已有的线程id)
 
 
 class OutputRedirector(object):
+    """替换sys.stdout/sys.stderr, 当前线程/协程在捕获输出时写入其缓冲, 否则写入原始流
+
+    用例中新建的线程不继承上下文中的缓冲: 只有一个用例在捕获输出(串行执行)时, 其开始后新建的线程的输出写入该用例;
+    多个用例并发执行(threads/异步)时无法确定所属用例, 写入原始流
+    """
     def __init__(self, fp):
         self.fp = fp
 
+    @property
+    def target(self):
+        buffer = _output_buffer.get()
+        if buffer is not None:
+            return buffer
+        if len(_capturing) == 1:
+            try:
+                buffer, thread_ids = _capturing[0]
+            except IndexError:  # 其他线程中用例刚刚结束
+                return self.fp
+            if threading.get_ident() not in thread_ids:
+                return buffer
+        return self.fp
+
     def write(self, s):
-        self.fp.write(s)
+        return self.target.write(s)
 
     def writelines(self, lines):
-        self.fp.writelines(lines)
+        self.target.writelines(lines)
 
     def flush(self):
-        self.fp.flush()
+        self.target.flush()
+
+    def __getattr__(self, name):  # encoding, isatty, fileno等
+        return getattr(self.fp, name)
 
 
 stdout_redirector = OutputRedirector(sys.stdout)
 stderr_redirector = OutputRedirector(sys.stderr)
 
 
+def install_redirector():
+    """只替换一次sys.stdout/sys.stderr, 之后捕获输出只需切换上下文中的缓冲"""
+    if sys.stdout is stdout_redirector and sys.stderr is stderr_redirector:
+        return
+    with _redirector_lock:
+        if sys.stdout is not stdout_redirector:
+            stdout_redirector.fp = sys.stdout
+            sys.stdout = stdout_redirector
+        if sys.stderr is not stderr_redirector:
+            stderr_redirector.fp = sys.stderr
+            sys.stderr = stderr_redirector
+
+
+def bind_output(context):
+    """使context(如asyncio用例的上下文)中的输出写入当前线程/协程的缓冲"""
+    context.run(_output_buffer.set, _output_buffer.get())
+
+
+def restore_output():
+    """还原sys.stdout/sys.stderr"""
+    with _redirector_lock:
+        if sys.stdout is stdout_redirector:
+            sys.stdout = stdout_redirector.fp
+        if sys.stderr is stderr_redirector:
+            sys.stderr = stderr_redirector.fp
+
+
 class Status(Enum):
     PASS = 'pass'
     FAIL = 'fail'
@@ -46,20 +102,273 @@ class Status(Enum):
     SKIPPED = 'skipped'
     XFAIL = 'xfail'
     XPASS = 'xpass'
+    TIMEOUT = 'timeout'
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value
+
+
+def jsonable_item(item, resolve_code=True) -> dict:
+    """转换为可json序列化的用例数据, 时间为isoformat字符串, 耗时为秒数
+
+    resolve_code为False时未截取的源码保存为code_ref(文件名, 行号), 不在运行中截取源码
+    """
+    data = {key: _jsonable(item[key]) for key in item.keys() if key not in ('obj', 'code')}
+    code = item._code if isinstance(item, TestRecord) else item.get('code')
+    if isinstance(code, SourceRef):
+        if not resolve_code:
+            data['code_ref'] = [code.filename, code.lineno]
+            code = None
+        else:
+            code = code.resolve()
+    data['code'] = code
+    return data
+
+
+ATTEMPT_FIELDS = ('status', 'start_at', 'end_at', 'duration', 'exec_info', 'output')
+
+
+def attempt_item(item) -> dict:
+    """用例的一次执行记录(重跑前的结果), 可json序列化"""
+    return {key: _jsonable(item[key]) for key in ATTEMPT_FIELDS}
+
+
+def load_item(data) -> dict:
+    """jsonable_item的逆转换"""
+    item = dict(data)
+    code_ref = item.pop('code_ref', None)
+    if code_ref:
+        item['code'] = SourceRef(*code_ref)
+    for key in ('start_at', 'end_at'):
+        if item.get(key):
+            item[key] = datetime.fromisoformat(item[key])
+    if item.get('duration') is not None:
+        item['duration'] = timedelta(seconds=item['duration'])
+    return item
+
+
+class TestRecord(object):
+    """单个用例的执行结果, 使用__slots__减少内存占用, 同时兼容dict的读取方式
+
+    code可以是SourceRef, 首次读取时才截取源码
+    """
+    FIELDS = ('obj', 'sn', 'name', 'full_name', 'full_path', 'doc', 'code', 'status', 'setup_status',
+              'teardown_status', 'test_class', 'test_class_doc', 'test_module', 'start_at', 'end_at',
+              'duration', 'exec_info', 'output', 'tags', 'level', 'images', 'attempts')
+    __slots__ = tuple(name for name in FIELDS if name != 'code') + ('_code',)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        for name in ('test_class', 'test_module', 'status'):  # 大量重复的字符串只保留一份
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(value))
+
+    @property
+    def code(self):
+        if isinstance(self._code, SourceRef):
+            self._code = self._code.resolve()
+        return self._code
+
+    @code.setter
+    def code(self, value):
+        self._code = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.FIELDS]
+
+    def update(self, data=None, **fields):
+        for key, value in dict(data or {}, **fields).items():
+            setattr(self, key, value)
+
+    def to_dict(self) -> dict:
+        """不包含用例对象的字段数据, 未截取的源码仍为SourceRef"""
+        data = {name: getattr(self, name) for name in self.FIELDS if name not in ('obj', 'code')}
+        data['code'] = self._code
+        return data
+
+    def __repr__(self):
+        return '<TestRecord %s %s>' % (self.full_path, self.status)
+
+
+class EventLog(object):
+    """以json lines格式逐条追加已完成的用例, 运行中断后也可以据此重建报告
+
+    重跑的用例每次执行都会写入, 读取时同一用例以最后一条为准
+    """
+    def __init__(self, path):
+        self.path = path
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, event, **data):
+        line = json.dumps(dict(event=event, **data), ensure_ascii=False)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + '\n')
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def start(self, result):
+        self.write('start', start_at=(getattr(result, 'start_at', None) or datetime.now()).isoformat())
+
+    def add(self, item):
+        self.write('test', **jsonable_item(item, resolve_code=False))
+
+    def finish(self, result):
+        self.write('end', end_at=(getattr(result, 'end_at', None) or datetime.now()).isoformat())
+        self.close()
+
+    @staticmethod
+    def read(path, offset=0):
+        """从offset处读取完整的事件行, 返回(事件列表, 新的offset)"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # 忽略正在写入的最后一行
+        events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return events, offset + end
+
+
+class GroupStats(object):
+    """测试类/模块的统计数据, 登记用例时增量更新, 生成报告时无需再遍历用例"""
+    __slots__ = ('name', 'test_cases', 'counts', 'duration', 'slowest', 'rerun_num', 'flaky_num')
+
+    def __init__(self, name):
+        self.name = name
+        self.test_cases = []
+        self.counts = defaultdict(int)  # 状态: 数量
+        self.duration = timedelta()
+        self.slowest = []  # 耗时最长的用例, 按耗时倒序
+        self.rerun_num = 0  # 重跑次数
+        self.flaky_num = 0  # 重跑后通过的用例数
+
+    def add(self, record):
+        self.counts[record.status] += 1
+        if record.attempts:
+            self.rerun_num += len(record.attempts)
+            self.flaky_num += record.status in PASSED_STATUSES
+        if record.duration is not None:
+            self.duration += record.duration
+            self.slowest.append(record)
+            self.slowest.sort(key=lambda x: x.duration, reverse=True)
+            del self.slowest[SLOWEST_NUM:]
+
+    def discard(self, record):
+        self.counts[record.status] -= 1
+        if record.attempts:
+            self.rerun_num -= len(record.attempts)
+            self.flaky_num -= record.status in PASSED_STATUSES
+        if record.duration is not None:
+            self.duration -= record.duration
+            if record in self.slowest:  # 从其他用例中补足最慢的用例
+                self.slowest = heapq.nlargest(SLOWEST_NUM, (item for item in self.test_cases if item is not record
+                                                            and item.duration is not None),
+                                              key=lambda x: x.duration)
+
+    @property
+    def total(self) -> int:
+        return len(self.test_cases)
+
+    @property
+    def max_duration(self):
+        return self.slowest[0].duration if self.slowest else None
+
+    def summary(self) -> dict:
+        return dict(
+            name=self.name,
+            test_cases=self.test_cases,
+            total=self.total,
+            pass_num=self.counts['PASS'],
+            error_num=self.counts['ERROR'],
+            fail_num=self.counts['FAIL'],
+            skipped_num=self.counts['SKIPPED'],
+            xfail_num=self.counts['XFAIL'],
+            xpass_num=self.counts['XPASS'],
+            timeout_num=self.counts['TIMEOUT'],
+            rerun_num=self.rerun_num,
+            flaky_num=self.flaky_num,
+            duration=round(self.duration.total_seconds(), 3),
+            max_duration=round(self.max_duration.total_seconds(), 3) if self.slowest else 0,
+            slowest=list(self.slowest),
+        )
+
+
+class TestClasses(object):
+    """可重复遍历的测试类统计数据, 每次遍历时才逐个生成"""
+    def __init__(self, result):
+        self.result = result
+
+    def __iter__(self):
+        return self.result.iter_classes()
+
+    def __len__(self):
+        return len(self.result.test_class)
+
+
+FAILED_STATUSES = ('FAIL', 'ERROR', 'TIMEOUT', 'XPASS')
+
+PASSED_STATUSES = ('PASS', 'XFAIL')
+
+RERUN_STATUSES = ('FAIL', 'ERROR', 'TIMEOUT')  # 可以重跑的状态
+
+SLOWEST_NUM = 3  # 每个测试类/模块记录的最慢用例数
+
+STATUS_LISTS = dict(PASS='success', FAIL='failures', ERROR='errors', SKIPPED='skipped', XFAIL='expectedFailures',
+                    XPASS='unexpectedSuccesses', TIMEOUT='timeouts')  # 状态: 对应的结果列表, 其他状态计入errors
 
 
 class Result(unittest.TestResult):
-    def __init__(self, verbosity=2):
+    def __init__(self, verbosity=2, event_log=None, release_tests=False, capture_code=True, image_writer=None,
+                 exporters=None, coverage_map=None):
         super().__init__(verbosity=verbosity)
         self.verbosity = verbosity
+        self.image_writer = image_writer or ImageWriter()  # 后台保存用例图片
+        self.capture_code = capture_code  # 是否记录用例代码, 'failed'只记录失败/出错的用例
+        self.release_tests = release_tests  # 登记结果后不再引用用例对象, 减少内存占用
+        self.event_log = EventLog(event_log) if isinstance(event_log, str) else event_log  # 事件日志
+        self.exporters = ([self.event_log] if self.event_log else []) + list(exporters or [])  # 逐个写入用例的导出
+        self.coverage_map = coverage_map  # 记录每个用例执行的源码行
+        self._running = set()
         self.timeouts = []
         self.success = []
-        self.timeouts = []
         self.result = {}
-        self.test_class = defaultdict(list)
+        self.test_class = {}  # 测试类名: GroupStats
+        self.test_module = {}  # 模块名: GroupStats
+        self._retired = {}  # 等待重跑的用例id: (之前的结果, 执行记录)
+        self.rerunnable = set()  # 失败后会重跑的用例id, 其失败结果在运行结束时才写入只导出最终结果的导出
+        self._deferred = {}  # 暂不导出的失败结果, 用例id: 用例数据
         self.sn = 1
-        self.stdout_bak = None
-        self.stderr_bak = None
 
     @property
     def totol(self):
@@ -77,85 +386,169 @@ class Result(unittest.TestResult):
         return super()._exc_info_to_string(err, test)
 
     def capture_output(self):
-        # 重定向sys.out和sys.err
-        self.output = io.StringIO()
-        stdout_redirector.fp = self.output
-        stderr_redirector.fp = self.output
-        self.stdout_bak = sys.stdout
-        self.stderr_bak = sys.stderr
-        sys.stdout = stdout_redirector
-        sys.stderr = stderr_redirector
+        # 当前线程/协程的输出写入独立缓冲
+        install_redirector()
+        buffer = io.StringIO()
+        _output_buffer.set(buffer)
+        thread_ids = frozenset(thread.ident for thread in threading.enumerate())
+        with _redirector_lock:
+            _capturing.append((buffer, thread_ids))
 
     def complete_output(self):
-        if self.stdout_bak:
-            sys.stdout = self.stdout_bak
-            sys.stderr = self.stderr_bak
-            self.stdout_bak = None
-            self.stderr_bak = None
-        return self.output.getvalue()
+        buffer = _output_buffer.get()
+        if buffer is None:
+            return ''
+        _output_buffer.set(None)
+        with _redirector_lock:
+            _capturing[:] = [item for item in _capturing if item[0] is not buffer]
+        return buffer.getvalue()
+
+    def _groups(self, record):
+        groups = []
+        for stats, name in ((self.test_class, record.test_class), (self.test_module, record.test_module)):
+            if name not in stats:
+                stats[name] = GroupStats(name)
+            groups.append(stats[name])
+        return groups
+
+    def _track(self, record, old_record=None):
+        """登记新的用例数据到所属测试类和模块的统计, old_record为被替换的数据"""
+        for group in self._groups(record):
+            if old_record is not None and old_record in group.test_cases:
+                group.discard(old_record)
+                group.test_cases[group.test_cases.index(old_record)] = record
+            else:
+                group.test_cases.append(record)
+            group.add(record)
+
+    def _add_record(self, item):
+        """登记新的用例数据, 重跑的用例沿用之前的序号并附加之前的执行记录"""
+        retired = self._retired.pop(item.full_path, None)
+        if retired:
+            old_item, item.attempts = retired
+            item.sn = old_item.sn
+        else:
+            old_item = self.result.get(item.full_path)
+            item.sn = self.sn
+            self.sn += 1
+        self._track(item, old_item)
+        self.result[item.full_path] = item
+
+    def _remove_from_status_list(self, record):
+        tests = getattr(self, STATUS_LISTS.get(record.status, 'errors'))
+        for entry in tests:
+            test = entry[0] if isinstance(entry, tuple) else entry
+            if (test if isinstance(test, str) else test.id()) == record.full_path:
+                tests.remove(entry)
+                break
+
+    def _add_to_status_list(self, record):
+        name = STATUS_LISTS.get(record.status, 'errors')
+        if name in ('success', 'timeouts', 'unexpectedSuccesses'):
+            getattr(self, name).append(record.full_path)
+        else:
+            getattr(self, name).append((record.full_path, record.exec_info or ''))
+
+    def retire(self, test_id):
+        """重跑前移除用例的结果, 作为一次执行记录附加到重跑后的结果中"""
+        record = self.result.pop(test_id)
+        self._remove_from_status_list(record)
+        self.testsRun -= 1
+        self._retired[test_id] = (record, list(record.attempts or []) + [attempt_item(record)])
+
+    def restore_retired(self):
+        """恢复未能重跑(如failfast停止执行)的用例结果"""
+        for test_id, (record, _) in self._retired.items():
+            self.result[test_id] = record
+            self._add_to_status_list(record)
+            self.testsRun += 1
+        self._retired.clear()
+
+    @property
+    def rerun_num(self) -> int:
+        return sum(group.rerun_num for group in self.test_class.values())
+
+    @property
+    def flaky_num(self) -> int:
+        return sum(group.flaky_num for group in self.test_class.values())
+
+    def _update_record(self, record, **fields):
+        """修改状态或耗时等统计相关的字段, 同步更新统计数据"""
+        groups = self._groups(record)
+        for group in groups:
+            group.discard(record)
+        record.update(fields)
+        for group in groups:
+            group.add(record)
+
+    def _emit(self, item):
+        """写入导出; final_only的导出(如JUnit XML)只写入最终结果, 可能重跑的失败结果暂缓到运行结束时写入"""
+        deferred = item.full_path in self.rerunnable and item.status in RERUN_STATUSES
+        if deferred:
+            self._deferred[item.full_path] = item
+        else:
+            self._deferred.pop(item.full_path, None)
+        for exporter in self.exporters:
+            if not (deferred and getattr(exporter, 'final_only', False)):
+                exporter.add(item)
+
+    def startTestRun(self):
+        for exporter in self.exporters:
+            exporter.start(self)
+
+    def stopTestRun(self):
+        self.image_writer.wait()
+        deferred = list(self._deferred.values())
+        self._deferred.clear()
+        for exporter in self.exporters:
+            if getattr(exporter, 'final_only', False):
+                for item in deferred:
+                    exporter.add(item)
+            exporter.finish(self)
 
     def startTest(self, test):
         self.capture_output()
         test.start_at = datetime.now()
+        self._running.add(test.id())
         super().startTest(test)
+        if self.coverage_map is not None:
+            self.coverage_map.start(test.id())
 
     def stopTest(self, test):
-        self.result[test.id()]['end_at'] = test.end_at = datetime.now()
-        self.result[test.id()]['duration'] = test.end_at - test.start_at
+        if self.coverage_map is not None:
+            self.coverage_map.stop()
+        self._running.discard(test.id())
+        test.end_at = datetime.now()
+        self._update_record(self.result[test.id()], end_at=test.end_at, duration=test.end_at - test.start_at)
         self.complete_output()
-
-    def update_test(self, test, status, exec_info='', setup_status=None, teardown_status=None, error_code=None):  # todo
-        output = self.complete_output()
-        sys.stdout.write(output)
-        last_output = self.result[test.id()].get(output, '')
-        last_exec_info = self.result[test.id()].get(output, '')
-        self.result[test.id()].update(
-            {
-                'output': '\n'.join([last_output, output]),
-                'exec_info': '\n'.join([last_exec_info, exec_info]),
-            }
-        )
-
-    def _save_images(self, imgs):  # todo try  base64 from url
-        new_imgs = []
-        if not os.path.exists('images'):
-            os.makedirs('images')
-        for img in imgs:
-            if not isinstance(img, (tuple, list)) or len(img) < 2:
-                log.error('images中每个需要是个二元序列')
-                return []
-            _type, _img = img
-
-            file_name = datetime.now().strftime(f'%Y%m%d%H%M%S_{randint(1, 100)}.png')
-            if _type == 'file':
-                file_name = os.path.basename(_img)
-                image_bin = open(_img, 'rb').read()
-            elif _type == 'base64':
-                image_bin = base64.b64decode(_img)
-            elif _type == 'bin':
-                image_bin = _img
-            elif _type == 'url':
-                res = urllib.request.urlopen(_img)
-                image_bin = res.read()
-            else:
-                raise NotImplementedError('只支持file,base64,bin,url格式')
-            image_file = os.path.join('images', file_name)
-            with open(image_file, 'wb') as fout:
-                fout.write(image_bin)
-            new_imgs.append(image_file)
-        return new_imgs
-
-    def _inspect_code(self, test):
-        test_method = getattr(test.__class__, test._testMethodName)
+        self._emit(self.result[test.id()])
+
+    def update_test(self, test, status, exec_info='', setup_status=None, teardown_status=None, error_code=None,
+                    output=None):  # todo
+        if output is None:
+            output = self.complete_output()
+            sys.stdout.write(output)
+        record = self.result[test.id()]
+        record.output = '\n'.join(filter(None, [record.output, output]))
+        record.exec_info = '\n'.join(filter(None, [record.exec_info, exec_info]))
+        if status == 'TIMEOUT':  # 超时覆盖之前的状态
+            self._update_record(record, status=sys.intern(status))
+        if record.code is None:  # 如tearDown出错时补充记录代码
+            record.code = self._inspect_code(test, status)
+
+    def _inspect_code(self, test, status):
+        """用例代码的源码位置, 读取时才截取源码; capture_code为'failed'时只记录失败/出错的用例代码"""
+        if not self.capture_code or (self.capture_code == 'failed' and status not in FAILED_STATUSES):
+            return None
+        test_method = getattr(test.__class__, test._testMethodName, None)
         try:
-            code = inspect.getsource(test_method)
+            return SourceRef.of(test_method) or inspect.getsource(test_method)
         except Exception as ex:
             log.exception(ex)
-            code = ''
-        return code
+            return ''
 
     def register(self, test, status, exec_info='', setup_status=None, teardown_status=None, error_code=None):   # todo
-        test.output = output = self.complete_output()
+        output = self.complete_output()
         sys.stdout.write(output)
         test_module_name = test.__module__
         test_class_name = test.__class__.__name__
@@ -170,71 +563,174 @@ class Result(unittest.TestResult):
 
         test_method = getattr(test.__class__, test_method_name)  # TODO  模块中代码块的失败
 
-        tags = get_case_tags(test)
-        level = get_case_level(test)
+        tags, level, _ = get_case_meta(test)
         images = get_case_images(test)
-        images = self._save_images(images)
+        images = self.image_writer.save(images)  # 图片在后台保存
 
         start_at = test.start_at if hasattr(test, 'start_at') else None
         end_at = None
         test.duration = duration = None
         test.status = status
 
-        code = self._inspect_code(test)
+        code = self._inspect_code(test, status)
 
         if test.id() not in self.result:
-            item = dict(obj=test,   # todo 添加为test属性
-                        sn=self.sn,
-                        name=test_method_name,
-                        full_name=str(test),
-                        full_path=test.id(),
-                        doc=test_method_doc,
-                        code=code,
-                        status=status,
-                        setup_status=setup_status,
-                        teardown_status=teardown_status,
-                        test_class=test_class_name,
-                        test_class_doc=test_class_doc,
-                        test_module=test_module_name,
-                        start_at=start_at,
-                        end_at=end_at,
-                        duration=duration,
-                        exec_info=exec_info,
-                        output=output,
-                        tags=tags,
-                        level=level,
-                        images=images
-                        )
-            self.result[test.id()] = item
-            self.sn += 1
+            item = TestRecord(obj=None if self.release_tests else test,
+                              sn=self.sn,
+                              name=test_method_name,
+                              full_name=str(test),
+                              full_path=test.id(),
+                              doc=test_method_doc,
+                              code=code,
+                              status=status,
+                              setup_status=setup_status,
+                              teardown_status=teardown_status,
+                              test_class=test_class_name,
+                              test_class_doc=test_class_doc,
+                              test_module=test_module_name,
+                              start_at=start_at,
+                              end_at=end_at,
+                              duration=duration,
+                              exec_info=exec_info,
+                              output=output,
+                              tags=tags,
+                              level=level,
+                              images=images
+                              )
+            self._add_record(item)
         else:
             self.update_test(test, status, exec_info=exec_info,
                              setup_status=setup_status,
                              teardown_status=teardown_status,
-                             error_code=error_code)
+                             error_code=error_code,
+                             output=output)
+        if test.id() not in self._running:  # 未执行的用例(如setUpClass失败)或执行结束后更新的用例
+            self._emit(self.result[test.id()])
+
+    def to_dict(self) -> dict:
+        """导出可序列化(pickle)的结果数据, 用例对象以test.id()表示"""
+        def _id(test):
+            return test if isinstance(test, str) else test.id()
+
+        def ids(tests):
+            return [_id(test) for test in tests]
+
+        def pairs(items):
+            return [(_id(item[0]),) + tuple(item[1:]) for item in items]
+
+        return dict(
+            start_at=getattr(self, 'start_at', None),
+            end_at=getattr(self, 'end_at', None),
+            testsRun=self.testsRun,
+            result=[item.to_dict() for item in self.result.values()],
+            success=ids(self.success),
+            timeouts=ids(self.timeouts),
+            failures=pairs(self.failures),
+            errors=pairs(self.errors),
+            skipped=pairs(self.skipped),
+            expectedFailures=pairs(self.expectedFailures),
+            unexpectedSuccesses=ids(self.unexpectedSuccesses),
+        )
+
+    def merge(self, data: dict, emit=True):
+        """合并其他进程中to_dict()导出的结果, 重新编排序号"""
+        for item in data['result']:
+            item = TestRecord(**item)
+            self._add_record(item)
+            if emit:
+                self._emit(item)
+        self.testsRun += data['testsRun']
+        self.success.extend(data['success'])
+        self.timeouts.extend(data['timeouts'])
+        self.failures.extend(data['failures'])
+        self.errors.extend(data['errors'])
+        self.skipped.extend(data['skipped'])
+        self.expectedFailures.extend(data['expectedFailures'])
+        self.unexpectedSuccesses.extend(data['unexpectedSuccesses'])
+        if self.failfast and (data['failures'] or data['errors'] or data['timeouts']):
+            self.stop()
+
+    def merge_result(self, other):
+        """合并同一进程中其他Result(如线程池中各线程)的结果, 直接移入其用例数据及结果列表中的用例对象"""
+        for item in other.result.values():
+            self._add_record(item)
+        self.testsRun += other.testsRun
+        for name in ('success', 'timeouts', 'failures', 'errors', 'skipped', 'expectedFailures',
+                     'unexpectedSuccesses'):
+            getattr(self, name).extend(getattr(other, name))
+        if self.failfast and (other.failures or other.errors or other.timeouts):
+            self.stop()
+
+    def add_item(self, item):
+        """添加一条用例数据(如从事件日志中读取), 同一用例再次添加时覆盖之前的数据"""
+        test_id = item['full_path']
+        old_item = self.result.get(test_id)
+        if old_item is None:
+            item = TestRecord(**dict(item, sn=self.sn))
+            self.sn += 1
+            if item.start_at:
+                self.testsRun += 1
+        else:
+            item = TestRecord(**dict(item, sn=old_item.sn))
+            self._remove_from_status_list(old_item)
+        self._track(item, old_item)
+        self.result[test_id] = item
+        self._add_to_status_list(item)
+        return item
+
+    def apply_events(self, events) -> set:
+        """应用事件日志中的事件, 返回有变化的测试类"""
+        changed_classes = set()
+        for event in events:
+            kind = event.pop('event')
+            if kind == 'start':
+                self.start_at = datetime.fromisoformat(event['start_at'])
+            elif kind == 'end':
+                self.end_at = datetime.fromisoformat(event['end_at'])
+            elif kind == 'test':
+                item = self.add_item(load_item(event))
+                changed_classes.add(item.test_class)
+        return changed_classes
+
+    @classmethod
+    def from_event_log(cls, path):
+        """根据事件日志重建结果, 运行中断时结束时间取最后一个用例的结束时间"""
+        result = cls()
+        result.start_at = result.end_at = None
+        result.apply_events(EventLog.read(path)[0])
+        if result.end_at is None:
+            end_times = [item.end_at for item in result.result.values() if item.end_at]
+            result.end_at = max(end_times) if end_times else result.start_at
+        return result
+
+    def iter_classes(self):
+        """按测试类名顺序逐个生成测试类的统计数据, 供模板流式渲染"""
+        for name in sorted(self.test_class, key=lambda x: x or ''):
+            yield self.test_class[name].summary()
+
+    def iter_modules(self):
+        """按模块名顺序逐个生成模块的统计数据"""
+        for name in sorted(self.test_module, key=lambda x: x or ''):
+            yield self.test_module[name].summary()
 
     def sortByClass(self):
-        sorted_result = sorted(list(self.result.values()), key=lambda x: x['test_class'])
-        data = defaultdict(dict)
-        for name, group in groupby(sorted_result, key=lambda x: x['test_class']):
-            test_cases = list(group)
-            data[name] = dict(
-                name=name,
-                test_cases=test_cases,
-                total=len(test_cases),
-                pass_num=len(list(filter(lambda x: x['status'] == "PASS", test_cases))),
-                error_num=len(list(filter(lambda x: x['status'] == "ERROR", test_cases))),
-                fail_num=len(list(filter(lambda x: x['status'] == "FAIL", test_cases))),
-                skipped_num=len(list(filter(lambda x: x['status'] == "SKIPPED", test_cases))),
-                xfail_num=len(list(filter(lambda x: x['status'] == "XFAIL", test_cases))),
-                xpass_num=len(list(filter(lambda x: x['status'] == "XPASS", test_cases)))
-            )
-        test_classes = list(data.values())
-
-        return test_classes
-
-    def addTimeout(self, err, test):  # todo remove
-        self.timeouts.append(test)
+        return list(self.iter_classes())
+
+    def _ref(self, test):
+        """结果列表中的用例, release_tests时只保留test.id()"""
+        return test.id() if self.release_tests else test
+
+    def _stop_if_failfast(self):
+        if self.failfast:
+            self.stop()
+
+    def addTimeout(self, test, err=None):
+        """用例执行超时, err为ExecutionTimeout的exc_info"""
+        self.timeouts.append(self._ref(test))
+        exec_info = self._exc_info_to_string(err, test) if err else 'Timeout'
+        self.register(test, 'TIMEOUT', exec_info)
+        if self.failfast:
+            self.stop()
 
     def handle_load_error(self, test, err):
         err_desc = test.id().replace('(', '').replace(')', '')
@@ -248,7 +744,7 @@ class Result(unittest.TestResult):
             tests = flatten_suite(tests)
             for unrun_test in tests:
                 exec_info = self._exc_info_to_string(err, test)
-                self.errors.append((unrun_test, exec_info))
+                self.errors.append((self._ref(unrun_test), exec_info))
                 self.register(unrun_test, 'LOAD_ERRROR', '')
 
     def handel_module_setup_teardown_error(self, test, err):
@@ -264,7 +760,7 @@ class Result(unittest.TestResult):
             tests = flatten_suite(tests)
             for unrun_test in tests:
                 exec_info = self._exc_info_to_string(err, test)
-                self.errors.append((unrun_test, ))
+                self.errors.append((self._ref(unrun_test), ))
                 # self.register(unrun_test, '%s_ERROR' % function_name, '')
                 self.register(unrun_test, 'ERROR')
 
@@ -283,12 +779,14 @@ class Result(unittest.TestResult):
             tests = flatten_suite(tests)
             for unrun_test in tests:
                 exec_info = self._exc_info_to_string(err, test)
-                self.errors.append((unrun_test, ))
+                self.errors.append((self._ref(unrun_test), ))
                 self.register(unrun_test, '%s_ERROR' % function_name, '')
 
     def addError(self, test, err):   # 模块或类级Excepition时 result.addError(error, sys.exc_info())
-        if isinstance(test, unittest.TestCase):
-            self.errors.append((test, self._exc_info_to_string(err, test)))
+        if isinstance(test, unittest.TestCase) and issubclass(err[0], ExecutionTimeout):
+            self.addTimeout(test, err)
+        elif isinstance(test, unittest.TestCase):
+            self.errors.append((self._ref(test), self._exc_info_to_string(err, test)))
             self.register(test, 'ERROR', self._exc_info_to_string(err, test))
 
         elif isinstance(test, unittest.loader._FailedTest):
@@ -303,22 +801,27 @@ class Result(unittest.TestResult):
             else:
                 print('不支持处理该错误 %s' %function_name)
 
+    # 与unittest.TestResult一致, 但结果列表中的用例由_ref决定, 以便release_tests时释放用例对象
     def addFailure(self, test, err):
-        super().addFailure(test, err)
-        self.register(test, 'FAIL', self._exc_info_to_string(err, test))
+        exec_info = self._exc_info_to_string(err, test)
+        self.failures.append((self._ref(test), exec_info))
+        self._stop_if_failfast()
+        self.register(test, 'FAIL', exec_info)
 
     def addSuccess(self, test):
-        self.success.append(test)
+        self.success.append(self._ref(test))
         self.register(test, 'PASS')
 
     def addSkip(self, test, reason):
-        super().addSkip(test, reason)
+        self.skipped.append((self._ref(test), reason))
         self.register(test, 'SKIPPED', reason)
 
     def addExpectedFailure(self, test, err):
-        super().addExpectedFailure(test, err)
-        self.register(test, 'XFAIL', self._exc_info_to_string(err, test))
+        exec_info = self._exc_info_to_string(err, test)
+        self.expectedFailures.append((self._ref(test), exec_info))
+        self.register(test, 'XFAIL', exec_info)
 
     def addUnexpectedSuccess(self, test):
-        super().addUnexpectedSuccess(test)
+        self.unexpectedSuccesses.append(self._ref(test))
+        self._stop_if_failfast()
         self.register(test, 'XPASS', 'UnexpectedSuccess')
\ No newline at end of file
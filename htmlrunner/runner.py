@@ -1,22 +1,41 @@
 import platform
 from datetime import datetime
 import os
+import json
+import hashlib
+import shutil
+import sys
 import time
 import unittest
 import threading
+import queue
+import ctypes
+import multiprocessing
+from multiprocessing import connection
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, Future, TimeoutError as FutureTimeoutError
+import asyncio
 
 from collections import defaultdict
 
 from logz import log
-from jinja2 import Template
 
-from htmlrunner.result import Result
+from htmlrunner.images import ImageWriter
+from htmlrunner.timings import TimingDB
+from htmlrunner.impact import CoverageMap
+from htmlrunner.exporters import get_exporter
+from htmlrunner.result import Result, TestClasses, EventLog, restore_output, jsonable_item, bind_output, \
+    RERUN_STATUSES
 from htmlrunner.loader import Loader
-from htmlrunner.utils import isnotsuite, group_test_by_class
+from htmlrunner.exceptions import ExecutionTimeout
+from htmlrunner.utils import isnotsuite, flatten_suite, group_test_by_class, shard_suite, is_loadable, \
+    get_case_reruns
 
 
 BASEDIR = os.path.dirname(os.path.abspath(__file__))
 
+TEMPLATE_DIR = os.path.join(BASEDIR, 'templates')
+
 
 DEFAULT_REPORT_FILE = 'report.html'
 
@@ -26,6 +45,14 @@ DEFAULT_REPORT_TITLE = 'TEST REPORT BY HTMLRUNNER'
 
 DEFAULT_TEMPLATE = 'default'
 
+LAZY_TEMPLATE = 'lazy'
+
+ASYNC_POLL_INTERVAL = 0.05  # 等待共享事件循环中的协程时的轮询间隔
+
+LAZY_PAGE_SIZE = 50  # 分页报告每页的测试类数
+
+REPORT_BUFFER_SIZE = 64  # 流式渲染时每次写入的模板片段数
+
 
 def run_suite_after(suite, result):  # todo
     suite._tearDownPreviousClass(None, result)
@@ -42,6 +69,151 @@ def run_suite_before_case(suite, case, result):  # todo
     return True
 
 
+_environments = {}
+
+
+def get_environment(template_dirs=None):
+    """按模板目录缓存jinja2 Environment, 用户模板目录优先于内置模板, 模板编译结果缓存在磁盘上"""
+    key = tuple(template_dirs or ())
+    env = _environments.get(key)
+    if env is None:
+        from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache  # 生成报告时才导入
+        env = _environments[key] = Environment(loader=FileSystemLoader([*key, TEMPLATE_DIR]),
+                                               bytecode_cache=FileSystemBytecodeCache())
+    return env
+
+
+def _init_worker(sys_path):
+    """子进程初始化, 同步主进程的sys.path以便按test.id()加载用例"""
+    for path in reversed(sys_path):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def _run_shard(test_ids, options):
+    """子进程中执行一个分片, 返回可序列化的结果数据"""
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+    runner = Runner(**options)
+    data = runner.run(suite).to_dict()
+    if runner.coverage_map is not None:
+        data['coverage'] = runner.coverage_map.tests
+    return data
+
+
+def _run_isolated(test_ids, options, conn):
+    """独立子进程中执行用例, 通过管道返回结果数据"""
+    conn.send(_run_shard(test_ids, options))
+    conn.close()
+
+
+WATCHDOG_GRACE = 1  # 超时后等待用例中断的时间(秒), 超过后记录警告
+
+
+class Watchdog(object):
+    """单个守护线程监控所有执行中用例的截止时间, 超时后向执行用例的线程抛出ExecutionTimeout
+
+    异常只在执行Python字节码时生效, 阻塞在C代码中(如socket.recv, time.sleep)的用例要等调用返回后才能中断,
+    可能一直无法结束; 超时WATCHDOG_GRACE秒后仍未结束时记录警告, 需要强制结束时使用isolate=True
+    """
+    def __init__(self):
+        self._deadlines = {}  # 线程id: (截止时间, 用例名称)
+        self._overdue = {}  # 已抛出异常的线程id: (记录警告的时间, 用例名称)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    @contextmanager
+    def watch(self, timeout, name=None):
+        ident = threading.get_ident()
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='htmlrunner-watchdog', daemon=True)
+                self._thread.start()
+            self._deadlines[ident] = (time.monotonic() + timeout, name)
+            self._condition.notify()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._deadlines.pop(ident, None)
+                self._overdue.pop(ident, None)
+
+    def _run(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                for ident, (deadline, name) in list(self._deadlines.items()):
+                    if deadline <= now:
+                        del self._deadlines[ident]
+                        self._overdue[ident] = (now + WATCHDOG_GRACE, name)
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident),
+                                                                   ctypes.py_object(ExecutionTimeout))
+                for ident, (deadline, name) in list(self._overdue.items()):
+                    if deadline <= now:
+                        del self._overdue[ident]
+                        log.warning('用例%s超时后仍未结束, 可能阻塞在C代码或IO中, '
+                                    '需要isolate=True才能强制结束' % (name or ''))
+                deadlines = [item[0] for item in (*self._deadlines.values(), *self._overdue.values())]
+                self._condition.wait(min(deadlines) - now if deadlines else None)
+
+
+watchdog = Watchdog()
+
+
+class SharedLoopRunner(object):
+    """代替IsolatedAsyncioTestCase自带的asyncio.Runner, 把用例的协程提交到共享的事件循环中执行
+
+    调用线程等待协程完成, 期间被注入ExecutionTimeout时取消协程
+    """
+    def __init__(self, loop, test):
+        self.loop = loop
+        self.test = test
+
+    def get_loop(self):
+        bind_output(self.test._asyncioTestContext)  # startTest之后才开始捕获输出
+        return self.loop
+
+    def run(self, coro, context=None):
+        future, tasks = Future(), []
+
+        def start():
+            task = self.loop.create_task(coro, context=context)
+            tasks.append(task)
+            task.add_done_callback(done)
+
+        def done(task):
+            if task.cancelled():
+                future.set_exception(asyncio.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        if context is not None:
+            bind_output(context)
+        self.loop.call_soon_threadsafe(start)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=ASYNC_POLL_INTERVAL)  # 分段等待, 以便接收超时异常
+                except FutureTimeoutError:
+                    continue
+        except BaseException:
+            if not future.done():
+                self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in tasks])
+            raise
+
+
+def run_async_test(test, result, loop):
+    """在共享的事件循环中执行IsolatedAsyncioTestCase用例, 不再为每个用例创建和关闭事件循环"""
+    if not hasattr(test, '_setupAsyncioRunner'):  # Python3.11以下仍使用用例自己的事件循环
+        return test(result)
+    test._asyncioRunner = SharedLoopRunner(loop, test)
+    try:
+        return unittest.TestCase.run(test, result)
+    finally:
+        test._asyncioRunner = None
+
+
 class Runner(object):
     def __init__(self,
                  threads=None,
@@ -50,41 +222,71 @@ class Runner(object):
                  failfast=False,
                  ensure_sequence=True,
                  check_all=False,
+                 workers=None,
+                 isolate=False,
+                 event_log=None,
+                 release_tests=False,
+                 capture_code=True,
+                 output=None,
+                 thumbnail=None,
+                 async_workers=None,
+                 timing_db=None,
+                 reruns=0,
+                 exporters=None,
+                 coverage_map=None,
                  **kwargs):
-        self.threads = threads
+        self.threads = threads  # 线程数
+        self.event_log = event_log  # 事件日志文件, 每个用例结束时追加一行
+        self.exporters = exporters or []  # 导出文件路径(按扩展名选择格式)或导出对象, 每个用例结束时写入
+        self.release_tests = release_tests  # 结果中不保留用例对象
+        self.capture_code = capture_code  # 是否记录用例代码, 'failed'只记录失败/出错的用例
+        self.output = output  # 输出目录, 用例图片保存在其下的images目录
+        self.thumbnail = thumbnail  # 图片缩略尺寸(宽, 高), 需要安装Pillow
+        self.workers = workers  # 进程数
+        self.isolate = isolate  # 每个用例在独立子进程中执行
+        self.async_workers = async_workers  # 共享事件循环中同时执行的异步用例数
+        self.timing_db = TimingDB(timing_db) if isinstance(timing_db, str) else timing_db  # 用例历史耗时
+        # 用例覆盖记录, 用于只执行受修改文件影响的用例
+        self.coverage_map = CoverageMap(coverage_map) if isinstance(coverage_map, str) else coverage_map
+        self._loop = None
         self.interval = interval
-        self.reruns = False  # todo
-        self.timeout = timeout   # 每个用例的执行时间
+        self.reruns = reruns  # 失败/出错/超时的用例最多重跑次数, 用例上的rerun装饰器优先
+        self.timeout = timeout   # 每个用例的执行时间, 阻塞在C代码/IO中的用例只有isolate=True时能强制结束
         self.failfast = failfast
         self.kwargs = kwargs
         self.ensure_sequence = ensure_sequence  # 确保运行顺序
         self.check_all = check_all  # todo
 
-    def run_with_threads(self, case, result):
-        assert self.threads and isinstance(self.threads, int) and self.threads > 0
-        if self.timeout:
-            assert isinstance(self.timeout, (float, int)) and self.timeout > 0
-
-        threads = []
-        for i in range(self.threads):
-            threads.append(threading.Thread(target=case, args=(result,)))
-
-        [t.start() for t in threads]
-
-        [t.join(timeout=self.timeout) for t in threads]
-
     def run_test(self, test, result):
-        """执行单个测试"""
-        if self.threads and isinstance(self.threads, int):
-            print(self.threads, self.timeout)
-            self.run_with_threads(test, result)
+        """执行单个测试, 设置timeout时超时的用例记录为TIMEOUT
+
+        默认在用例线程中抛出ExecutionTimeout, 阻塞在C代码/IO中的用例要等调用返回后才能中断;
+        只有isolate=True(子进程中执行)能强制结束阻塞的用例
+        """
+        if self.timeout and isnotsuite(test):
+            try:
+                with watchdog.watch(self.timeout, test.id()):
+                    self._call_test(test, result)
+            except ExecutionTimeout:  # 超时发生在用例之外(如startTest/stopTest中)
+                result.addTimeout(test, sys.exc_info())
         else:
-            test(result)
+            self._call_test(test, result)
         interval = self.interval
-        print('interval', interval)
         if interval and isinstance(interval, (int, float)):
             time.sleep(interval)
 
+    def _trace(self, key):
+        """记录执行的源码行到覆盖记录的key下, 用例本身的记录由Result在startTest/stopTest中进行"""
+        if self.coverage_map is None:
+            return nullcontext()
+        return self.coverage_map.trace(key)
+
+    def _call_test(self, test, result):
+        if self._loop is not None and isinstance(test, unittest.IsolatedAsyncioTestCase):
+            run_async_test(test, result, self._loop)
+        else:
+            test(result)
+
     def run_suite(self, suite, result):
         """基础运行suite方法"""
         log.info('执行测试套件:', suite)
@@ -94,7 +296,8 @@ class Runner(object):
 
         for index, test in enumerate(suite):
             if isnotsuite(test):
-                setup_ok = run_suite_before_case(suite, test, result)
+                with self._trace('%s.%s' % (test.__class__.__module__, test.__class__.__qualname__)):  # 测试类夹具
+                    setup_ok = run_suite_before_case(suite, test, result)
                 if not setup_ok:
                     continue
             self.run_test(test, result)
@@ -107,13 +310,237 @@ class Runner(object):
 
         return result
 
+    def _worker_options(self):
+        """子进程中Runner的运行选项"""
+        return dict(timeout=self.timeout, interval=self.interval, failfast=self.failfast,
+                    capture_code=self.capture_code, output=self.output, thumbnail=self.thumbnail,
+                    coverage_map=self.coverage_map)
+
+    def _merge(self, result, data):
+        """合并子进程的结果数据及用例覆盖记录"""
+        result.merge(data)
+        if self.coverage_map is not None and data.get('coverage'):
+            self.coverage_map.update(data['coverage'])
+
+    def schedule(self, shards, key=None) -> list:
+        """有历史耗时时按估计耗时从长到短领取分片, 避免耗时长的分片最后才开始执行"""
+        return self.timing_db.schedule(shards, key) if self.timing_db else shards
+
+    def run_suite_in_processes(self, suite, result):
+        """按测试类/模块分片, 在进程池中并行执行, 结果合并到result"""
+        assert isinstance(self.workers, int) and self.workers > 0
+        remote_shards, local_shards = [], []
+        for shard in self.schedule(shard_suite(suite)):
+            if all(is_loadable(test) for test in shard):
+                remote_shards.append(shard)
+            else:
+                local_shards.append(shard)
+
+        options = self._worker_options()
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_init_worker, initargs=(sys.path,)) as executor:
+            futures = [executor.submit(_run_shard, [test.id() for test in shard], options)
+                       for shard in remote_shards]
+            for shard in local_shards:  # 无法在子进程中加载的用例在主进程中执行
+                self.run_suite(shard, result)
+            for future in futures:
+                if result.shouldStop:
+                    future.cancel()
+                    continue
+                self._merge(result, future.result())
+        return result
+
+    def _add_unfinished(self, test, result, start_at, message, exc_class=RuntimeError):
+        """记录未正常结束的子进程中的用例"""
+        result.startTest(test)
+        test.start_at = start_at
+        try:
+            raise exc_class(message)
+        except exc_class:
+            result.addError(test, sys.exc_info())
+        result.stopTest(test)
+
+    def run_suite_isolated(self, suite, result):
+        """每个用例在独立子进程中执行(最多workers个同时执行), 超时的子进程被强制结束"""
+        options = dict(self._worker_options(), timeout=None)  # 由主进程负责超时
+        pending = self.schedule(list(flatten_suite(suite)), key=lambda test: [test])
+        pending.reverse()
+        running = {}  # 管道: (子进程, 用例, 开始时间, 截止时间)
+        max_running = self.workers or 1
+        while (pending or running) and not result.shouldStop:
+            while pending and len(running) < max_running:
+                test = pending.pop()
+                if not is_loadable(test):  # 无法在子进程中加载的用例在主进程中执行
+                    self.run_suite(unittest.TestSuite([test]), result)
+                    continue
+                reader, writer = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_run_isolated, args=([test.id()], options, writer),
+                                                  daemon=True)
+                process.start()
+                writer.close()
+                deadline = time.monotonic() + self.timeout if self.timeout else None
+                running[reader] = (process, test, datetime.now(), deadline)
+            if not running:
+                continue
+
+            deadlines = [deadline for *_, deadline in running.values() if deadline]
+            wait = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            for reader in connection.wait(list(running), timeout=wait):
+                process, test, start_at, deadline = running.pop(reader)
+                try:
+                    self._merge(result, reader.recv())
+                except EOFError:
+                    process.join()
+                    self._add_unfinished(test, result, start_at, '用例进程异常退出, exitcode=%s' % process.exitcode)
+                process.join()
+
+            now = time.monotonic()
+            for reader, (process, test, start_at, deadline) in list(running.items()):
+                if deadline and deadline <= now:
+                    process.kill()
+                    process.join()
+                    del running[reader]
+                    self._add_unfinished(test, result, start_at, '用例执行超过%ss' % self.timeout,
+                                         exc_class=ExecutionTimeout)
+
+        for process, *_ in running.values():  # failfast
+            process.kill()
+            process.join()
+        return result
+
+    def run_suite_async(self, suite, result):
+        """异步用例(IsolatedAsyncioTestCase)共享一个事件循环, 最多async_workers个用例同时执行
+
+        线程只负责等待协程完成, 按run_suite_in_thread_pool的规则领取用例,
+        ensure_sequence为True时同一测试类的用例按顺序执行, 同步用例照常在线程中执行
+        """
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever, name='htmlrunner-asyncio', daemon=True)
+        loop_thread.start()
+        self._loop = loop
+        try:
+            return self.run_suite_in_thread_pool(suite, result, threads=self.async_workers)
+        finally:
+            self._loop = None
+            asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join()
+            loop.close()
+
+    def run_suite_in_thread_pool(self, suite, result, threads=None):
+        """固定数量的线程从同一队列中领取不同的用例执行, 每个线程使用独立的Result, 结束后合并到result
+
+        ensure_sequence为True时同一测试类的用例在一个线程中按顺序执行
+        """
+        thread_num = threads or self.threads
+        assert isinstance(thread_num, int) and thread_num > 0
+        shards = queue.SimpleQueue()
+        for shard in self.schedule(shard_suite(suite, split_classes=not self.ensure_sequence)):
+            shards.put(shard)
+
+        def worker(thread_result):
+            while not result.shouldStop:
+                try:
+                    shard = shards.get_nowait()
+                except queue.Empty:
+                    break
+                self.run_suite(shard, thread_result)
+                if thread_result.shouldStop:
+                    result.stop()
+
+        thread_results = []
+        retired = dict(result._retired)  # 重跑的用例在线程中登记时即附加之前的执行记录, 导出时已完整
+        for i in range(thread_num):
+            thread_result = result.__class__(exporters=result.exporters,  # 用例结束时即写入事件日志及导出文件
+                                             release_tests=result.release_tests,
+                                             capture_code=result.capture_code,
+                                             image_writer=result.image_writer,
+                                             coverage_map=result.coverage_map)
+            thread_result.failfast = result.failfast
+            thread_result.rerunnable, thread_result._deferred = result.rerunnable, result._deferred
+            thread_result._retired = retired
+            thread_results.append(thread_result)
+        threads = [threading.Thread(target=worker, args=(thread_result,), daemon=True)
+                   for thread_result in thread_results]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+
+        for thread_result in thread_results:
+            result.merge_result(thread_result)
+        return result
+
+    def _dispatch(self, suite, result):
+        if self.isolate:
+            self.run_suite_isolated(suite, result)
+        elif self.workers:
+            self.run_suite_in_processes(suite, result)
+        elif self.async_workers:
+            self.run_suite_async(suite, result)
+        elif self.threads:
+            self.run_suite_in_thread_pool(suite, result)
+        else:
+            self.run_suite(suite, result)
+
+    def rerun_failed(self, tests, result):
+        """重跑失败/出错/超时的用例, 每轮只执行仍然失败且未达到重跑次数的用例, 与首次运行使用相同的执行方式
+
+        tests为用例id: (测试类, 方法名), 每次重跑使用新的用例对象; 每次执行的结果记录在attempts中
+        """
+        attempt = 0
+        while not result.shouldStop:
+            attempt += 1
+            suite = unittest.TestSuite()
+            for test_id, item in list(result.result.items()):
+                if item.status not in RERUN_STATUSES or test_id not in tests:
+                    continue
+                test_class, method_name = tests[test_id]
+                test = test_class(method_name)
+                if get_case_reruns(test, self.reruns) >= attempt:
+                    result.retire(test_id)
+                    suite.addTest(test)
+            if not suite.countTestCases():
+                break
+            log.info('第%s次重跑%s个用例' % (attempt, suite.countTestCases()))
+            # 上一轮结束时已执行tearDownClass/tearDownModule, 重跑时重新执行setUpClass/setUpModule
+            result._previousTestClass = None
+            result._moduleSetUpFailed = False
+            for test in suite:
+                test.__class__._classSetupFailed = False
+            try:
+                self._dispatch(suite, result)
+            finally:
+                result.restore_retired()
+        return result
+
     def run(self, suite, callback=None, interval=None):
-        result = Result()
+        exporters = [get_exporter(exporter) if isinstance(exporter, str) else exporter for exporter in self.exporters]
+        result = Result(event_log=self.event_log, release_tests=self.release_tests,
+                        capture_code=self.capture_code,
+                        image_writer=ImageWriter(self.output, thumbnail=self.thumbnail),
+                        exporters=exporters, coverage_map=self.coverage_map)
         result.failfast = self.failfast is True
 
+        tests = {}  # 可能需要重跑的用例, 只记录测试类和方法名
+        for test in flatten_suite(suite):
+            if isinstance(test, unittest.TestCase) and not isinstance(test, unittest.loader._FailedTest):
+                tests[test.id()] = (test.__class__, test._testMethodName)
+                if get_case_reruns(test, self.reruns) > 0:
+                    result.rerunnable.add(test.id())
+
         result.start_at = datetime.now()
-        self.run_suite(suite, result)
-        result.end_at = datetime.now()
+        result.startTestRun()
+        try:
+            self._dispatch(suite, result)
+            self.rerun_failed(tests, result)
+        finally:
+            restore_output()
+            result.end_at = datetime.now()
+            result.stopTestRun()
+            if self.timing_db:
+                self.timing_db.update(result)
+                self.timing_db.save()
+            if self.coverage_map:
+                self.coverage_map.save()
         if callback:
             callback(result)
         return result
@@ -122,32 +549,83 @@ class Runner(object):
 class HTMLRunner(Runner):
     def __init__(self, report_file=None, log_file=None,  output=None, # 报告文件, 日志文件, 自动创建路径
                  title=None, description=None, tester=None,   # 报告内容
-                 template=None, lang=None,  # 模板及语言
+                 template=None, template_dirs=None, lang=None,  # 模板及语言
+                 lazy=False, page_size=LAZY_PAGE_SIZE,  # 分页报告, 用例详情按测试类拆分为数据文件
                  verbosity=2, failfast=False,
                  threads=None, timeout=None,  # 运行选项
-                 interval=None,
+                 interval=None, workers=None, isolate=False,
+                 event_log=None, refresh_interval=None,  # 事件日志, 运行中定时刷新报告
+                 release_tests=False, capture_code=True, thumbnail=None,
+                 async_workers=None,  # 异步用例并发数
+                 timing_db=None,  # 历史耗时文件, 并行执行时按耗时分配分片
+                 reruns=0,  # 失败用例重跑次数
+                 exporters=None,  # 导出文件, 如['result.xml', 'result.jsonl', 'result.htrb']
+                 coverage_map=None,  # 用例覆盖记录文件
                  **kwargs):  # 额外信息
         self.verbosity = verbosity
         self.failfast = failfast
         self.interval = interval
         self.output = output
-        self.report_file = datetime.now().strftime(report_file or DEFAULT_REPORT_FILE)
+        self.report_file = os.path.join(output or '', datetime.now().strftime(report_file or DEFAULT_REPORT_FILE))
         self.log_file = log.file = datetime.now().strftime(log_file or DEFAULT_LOG_FILE)
 
         self.title = title or DEFAULT_REPORT_TITLE
         self.description = description
         self.tester = tester
-        self.template = template or DEFAULT_TEMPLATE
+        self.lazy = lazy
+        self.page_size = page_size
+        self.template = template or (LAZY_TEMPLATE if lazy else DEFAULT_TEMPLATE)
+        self.template_dirs = list(template_dirs or [])  # 自定义模板目录
         self.kwargs = kwargs
-        super().__init__(threads, timeout, interval)
-
-    def generate_report(self, result):
-        template_path = os.path.join(BASEDIR, 'templates', '%s.html' % self.template)
-
-        with open(template_path) as f:
-            template_content = f.read()
-
-        test_classes = result.sortByClass()
+        self.refresh_interval = refresh_interval
+        if refresh_interval and not event_log:
+            event_log = '%s.jsonl' % os.path.splitext(self.report_file)[0]
+        self._live_report = None
+        super().__init__(threads, timeout, interval, failfast=failfast, workers=workers, isolate=isolate,
+                         event_log=event_log, release_tests=release_tests, capture_code=capture_code,
+                         output=output, thumbnail=thumbnail, async_workers=async_workers,
+                         timing_db=timing_db, reruns=reruns, exporters=exporters, coverage_map=coverage_map)
+
+    def get_template(self, template=None):
+        """template可以是模板名(在template_dirs及内置模板目录中查找)或模板文件路径, 默认为self.template"""
+        template = template or self.template
+        template_dirs, template_name = self.template_dirs, '%s.html' % template
+        if os.path.isfile(template):
+            template_dirs = [os.path.dirname(os.path.abspath(template)), *template_dirs]
+            template_name = os.path.basename(template)
+        return get_environment(template_dirs).get_template(template_name)
+
+    @property
+    def data_dir(self):
+        """分页报告的数据文件目录"""
+        return '%s_data' % os.path.splitext(self.report_file)[0]
+
+    def write_data_files(self, result, changed_classes=None) -> list:
+        """每个测试类的用例详情写入一个数据文件(jsonp格式, 本地打开报告时也能按需加载), 返回测试类概要
+
+        数据文件名由测试类名生成, 指定changed_classes时只重写这些测试类的数据文件
+        """
+        data_dir = self.data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        classes = []
+        for test_class in result.iter_classes():
+            test_cases = test_class.pop('test_cases')
+            key = hashlib.md5((test_class['name'] or '').encode('utf-8')).hexdigest()[:16]
+            file_name = 'class_%s.js' % key
+            if changed_classes is None or test_class['name'] in changed_classes:
+                with open(os.path.join(data_dir, file_name), 'w', encoding='utf-8') as f:
+                    f.write('htmlrunnerLoad("%s", ' % key)
+                    json.dump([jsonable_item(item) for item in test_cases], f, ensure_ascii=False)
+                    f.write(');\n')
+            test_class.update(key=key, src='%s/%s' % (os.path.basename(data_dir), file_name),
+                              slowest=[item.full_path for item in test_class['slowest']])
+            classes.append(test_class)
+        return classes
+
+    def generate_report(self, result, changed_classes=None, live=False):
+        """生成报告; live为运行中刷新, 总是使用分页报告, 每次只重写changed_classes的数据文件而不重新渲染所有用例"""
+        lazy = self.lazy or live
+        test_classes = TestClasses(result)
         # 报告配置信息
         report_config_info = {
             "title": self.title,
@@ -164,10 +642,12 @@ class HTMLRunner(Runner):
             "error_num": len(result.errors),
             "xfail_num": len(result.expectedFailures),
             "xpass_num": len(result.unexpectedSuccesses),
-            "rerun_num": 0,
+            "timeout_num": len(result.timeouts),
+            "rerun_num": result.rerun_num,
+            "flaky_num": result.flaky_num,
             "start_at": result.start_at,
             "end_at": result.end_at,
-            "duration": result.end_at - result.start_at,
+            "duration": (result.end_at or datetime.now()) - result.start_at,
         }
         # 环境信息
         env_info = result.get_env_info()
@@ -176,23 +656,89 @@ class HTMLRunner(Runner):
             "test_cases": result.result,
             "test_classes": test_classes,
         }
+        if lazy:
+            if self.output and not os.path.isdir(self.output):
+                os.makedirs(self.output, exist_ok=True)
+            classes = self.write_data_files(result, changed_classes)
+            context.update(page_size=self.page_size,
+                           classes_json=json.dumps(classes, ensure_ascii=False).replace('</', '<\\/'))
         [context.update(info) for info in (report_config_info,
                                            result_stats_info,
                                            env_info,
                                            self.kwargs)]  # 额外变量
 
-        content = Template(template_content).render(context)
-        if self.output:
-            if not os.path.isdir(self.output):
-                os.makedirs(self.output)  # todo try
-        self.report_file = os.path.join(self.output, self.report_file)
-        with open(self.report_file, "w") as f:
-            f.write(content)
+        # 分块写入报告文件, 不在内存中拼接完整报告
+        stream = self.get_template(LAZY_TEMPLATE if lazy and not self.lazy else None).stream(context)
+        stream.enable_buffering(REPORT_BUFFER_SIZE)
+        if self.output and not os.path.isdir(self.output):
+            os.makedirs(self.output, exist_ok=True)
+        with open(self.report_file, "w", encoding='utf-8') as f:
+            stream.dump(f)
+
+    def generate_report_from_log(self, event_log=None):
+        """根据事件日志重新生成报告, 用于运行中断后恢复报告"""
+        result = Result.from_event_log(event_log or self.event_log)
+        self.generate_report(result)
+        return result
+
+    def _generate_final_report(self, result):
+        live = self._live_report is not None
+        if live:
+            self._live_report.stop()
+            self._live_report = None
+        self.generate_report(result)
+        if live and not self.lazy:  # 最终报告不使用运行中刷新的数据文件
+            shutil.rmtree(self.data_dir, ignore_errors=True)
 
     def run(self, suite, callback=None, interval=None, debug=False):
-        result = super().run(suite, callback=self.generate_report, interval=interval)
+        if self.refresh_interval:
+            self._live_report = LiveReport(self, self.event_log, self.refresh_interval)
+            self._live_report.start()
+        try:
+            result = super().run(suite, callback=self._generate_final_report, interval=interval)
+        finally:
+            if self._live_report:
+                self._live_report.stop()
+                self._live_report = None
         return result
 
 
+class LiveReport(threading.Thread):
+    """后台定时读取事件日志中新增的用例并刷新报告, 每次只处理新增的事件
+
+    刷新时总是生成分页报告(lazy模板), 只重写有变化的测试类的数据文件, 运行结束后再按配置的模板生成最终报告
+    """
+    def __init__(self, runner, event_log, interval):
+        super().__init__(name='htmlrunner-live-report', daemon=True)
+        self.runner = runner
+        self.event_log = event_log
+        self.interval = interval
+        self.result = Result()
+        self.result.start_at = datetime.now()
+        self.result.end_at = None
+        self.offset = 0
+        self._stopped = threading.Event()
+
+    def refresh(self):
+        if not os.path.isfile(self.event_log):
+            return
+        events, self.offset = EventLog.read(self.event_log, self.offset)
+        changed_classes = self.result.apply_events(events)
+        if changed_classes:
+            self.runner.generate_report(self.result, changed_classes, live=True)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as ex:  # 刷新失败不影响用例执行
+                log.exception(ex)
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,79 @@
+import os
+import json
+
+TIMING_VERSION = 1
+
+TIMING_ALPHA = 0.5  # 新耗时的权重, 平滑单次运行的波动
+
+DEFAULT_DURATION = 1.0  # 没有任何历史耗时时每个用例的估计耗时(秒)
+
+
+def _class_name(test_id):
+    return test_id.rsplit('.', 1)[0]
+
+
+class TimingDB(object):
+    """用例历史耗时(秒), 以test.id()为键持久化为json文件, 用于按耗时分配并行执行的分片"""
+    def __init__(self, path=None):
+        self.path = path
+        self.tests = {}  # 用例id: 平滑后的耗时
+        self._class_avg = None
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except ValueError:  # 文件损坏时重新记录
+                data = {}
+            if data.get('version') == TIMING_VERSION:
+                self.tests = data['tests']
+
+    def update(self, result):
+        """记录一次运行中各用例的耗时"""
+        for test_id, item in result.result.items():
+            if item.duration is None:
+                continue
+            seconds = item.duration.total_seconds()
+            old = self.tests.get(test_id)
+            self.tests[test_id] = seconds if old is None else old + TIMING_ALPHA * (seconds - old)
+        self._class_avg = None
+
+    def _build_class_avg(self):
+        durations = {}
+        for test_id, seconds in self.tests.items():
+            durations.setdefault(_class_name(test_id), []).append(seconds)
+        self._class_avg = {name: sum(items) / len(items) for name, items in durations.items()}
+        return self._class_avg
+
+    @property
+    def average(self) -> float:
+        return sum(self.tests.values()) / len(self.tests) if self.tests else DEFAULT_DURATION
+
+    def estimate(self, test_id) -> float:
+        """用例的估计耗时, 新用例取同一测试类的平均耗时, 新的测试类取所有用例的平均耗时"""
+        if test_id in self.tests:
+            return self.tests[test_id]
+        class_avg = self._class_avg if self._class_avg is not None else self._build_class_avg()
+        if _class_name(test_id) in class_avg:
+            return class_avg[_class_name(test_id)]
+        return self.average
+
+    def schedule(self, shards, key=None) -> list:
+        """按估计耗时从长到短排列分片(LPT), 空闲的执行者依次领取时总耗时最接近最优
+
+        key为分片中的用例列表, 默认为分片本身
+        """
+        key = key or list
+        costs = [sum(self.estimate(test.id()) for test in key(shard)) for shard in shards]
+        order = sorted(range(len(shards)), key=lambda i: costs[i], reverse=True)  # 稳定排序, 耗时相同时保持原顺序
+        return [shards[i] for i in order]
+
+    def save(self):
+        if not self.path:
+            return
+        dir_name = os.path.dirname(self.path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(version=TIMING_VERSION, tests=self.tests), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,15 +1,30 @@
 import re
+import sys
+import inspect
+import tokenize
 import unittest
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 
-TAG_PARTTEN = 'tag:(\w+)'
+TAG_PARTTEN = re.compile(r'tag:(\w+)')
 
-LEVEL_PARTTEN = 'level:(\d+)'
+LEVEL_PARTTEN = re.compile(r'level:(\d+)')
 
-ORDER_PARTTEN = 'order:(\d+)'
+ORDER_PARTTEN = re.compile(r'order:(\d+)')
 
-GLOBAL_ORDER_PARTTEN = 'global_order:(\d+)'
+GLOBAL_ORDER_PARTTEN = re.compile(r'global_order:(\d+)')
+
+DEFAULT_LEVEL = -1
+
+DEFAULT_ORDER = 100
+
+CaseMeta = namedtuple('CaseMeta', 'tags level order')
+
+_case_meta_cache = {}
+
+_source_lines = {}  # 文件名: 源码行列表, 每个文件只读取一次
+
+_source_cache = {}  # (文件名, 起始行号): 函数源码
 
 
 def isnotsuite(test):
@@ -35,6 +50,11 @@ def flatten_suite(suite):
     return new_suite
 
 
+def copy_suite(suite):
+    """复制suite的层级结构, 用例对象不复制"""
+    return suite.__class__(test if isnotsuite(test) else copy_suite(test) for test in suite)
+
+
 def group_test_by_class(suite: unittest.TestSuite) -> unittest.TestSuite:
     suite = flatten_suite(suite)
     suite_dict = defaultdict(unittest.TestSuite)
@@ -44,47 +64,133 @@ def group_test_by_class(suite: unittest.TestSuite) -> unittest.TestSuite:
     return unittest.TestSuite(suite_dict.values())
 
 
+def has_module_fixture(test) -> bool:
+    """用例所在模块是否定义了setUpModule/tearDownModule"""
+    module = sys.modules.get(test.__class__.__module__)
+    return hasattr(module, 'setUpModule') or hasattr(module, 'tearDownModule')
+
+
+def is_loadable(test) -> bool:
+    """用例能否在其他进程中通过test.id()重新加载"""
+    test_class = test.__class__
+    if test_class.__module__ == '__main__' or '<locals>' in test_class.__qualname__:
+        return False
+    obj = sys.modules.get(test_class.__module__)
+    for name in test_class.__qualname__.split('.'):
+        obj = getattr(obj, name, None)
+    return obj is test_class
+
+
+def has_class_fixture(test) -> bool:
+    """用例所在测试类是否重写了setUpClass/tearDownClass"""
+    test_class = test.__class__
+    return any(getattr(test_class, name).__func__ is not getattr(unittest.TestCase, name).__func__
+               for name in ('setUpClass', 'tearDownClass') if hasattr(test_class, name))
+
+
+def shard_suite(suite: unittest.TestSuite, split_classes=False) -> list:
+    """按测试类切分为多个suite, 定义了模块级fixture的模块整体作为一个分片, 保证fixture只在一个分片中执行
+
+    split_classes为True时, 没有类级和模块级fixture的测试类进一步拆分为单个用例
+    """
+    shards = {}
+    for test in flatten_suite(suite):
+        test_class = test.__class__
+        if has_module_fixture(test):
+            key = test_class.__module__
+        elif split_classes and not has_class_fixture(test):
+            key = test
+        else:
+            key = test_class
+        shards.setdefault(key, unittest.TestSuite()).addTest(test)
+    return list(shards.values())
+
+
+def get_case_meta(case) -> CaseMeta:
+    """一次解析用例的tags/level/order, @tag/@level/@order装饰器的设置优先于docstring, 结果按测试方法缓存"""
+    key = (case.__class__, case._testMethodName)
+    meta = _case_meta_cache.get(key)
+    if meta is not None:
+        return meta
+
+    case_doc = case._testMethodDoc or ''
+    test_method = getattr(case.__class__, case._testMethodName, None)
+    tags = TAG_PARTTEN.findall(case_doc) if 'tag' in case_doc else []
+    decorated_tags = getattr(test_method, 'tags', None) or []
+    for tag in [decorated_tags] if isinstance(decorated_tags, str) else decorated_tags:
+        if tag not in tags:
+            tags.append(tag)
+    level = getattr(test_method, 'level', None)
+    if level is None:
+        levels = LEVEL_PARTTEN.findall(case_doc)
+        level = int(levels[0]) if levels else DEFAULT_LEVEL
+    order = getattr(test_method, 'order', None)
+    if order is None:
+        orders = ORDER_PARTTEN.findall(case_doc)
+        order = int(orders[0]) if orders else DEFAULT_ORDER
+    if not isinstance(level, int) or not isinstance(order, int):
+        raise ValueError(f'用例中level/order设置：{level}/{order} 应为整数格式')
+
+    meta = _case_meta_cache[key] = CaseMeta(tags, level, order)
+    return meta
+
+
 def get_case_tags(case) -> list:
-    case_tags = []
-    case_doc = case._testMethodDoc
-    if case_doc and 'tag' in case_doc:
-        pattern = re.compile(TAG_PARTTEN)
-        case_tags = re.findall(pattern, case_doc)
-    return case_tags
+    return get_case_meta(case).tags
 
 
 def get_case_level(case):
-    case_doc = case._testMethodDoc
-    case_level = -1  # todo 默认level
-    if case_doc:
-        pattern = re.compile(LEVEL_PARTTEN)
-        levels = re.findall(pattern, case_doc)
-        if levels:
-            case_level = levels[0]
-            try:
-                case_level = int(case_level)
-            except:
-                raise ValueError(f'用例中level设置：{case_level} 应为整数格式')
-    return case_level
+    return get_case_meta(case).level
 
 
 def get_case_order(case):
-    case_doc = case._testMethodDoc
-    case_order = 100  # todo
-    if case_doc:
-        pattern = re.compile(ORDER_PARTTEN)
-        orders = re.findall(pattern, case_doc)
-        if orders:
-            case_order = orders[0]
-            try:
-                case_order = int(case_order)
-            except:
-                raise ValueError(f'用例中order设置：{case_order} 应为整数格式')
-    return case_order
+    return get_case_meta(case).order
+
+
+def get_case_reruns(case, default=0) -> int:
+    """用例失败后的重跑次数, 由rerun装饰器设置在用例方法或测试类上"""
+    test_method = getattr(case.__class__, getattr(case, '_testMethodName', ''), None)
+    return getattr(test_method, 'reruns', getattr(case.__class__, 'reruns', default))
 
 
 def get_case_images(case):
     if hasattr(case, 'images'):
         images = case.images
         return images
-    return []
\ No newline at end of file
+    return []
+
+def _read_source_lines(filename) -> list:
+    if filename not in _source_lines:
+        try:
+            with tokenize.open(filename) as f:  # 按文件声明的编码读取
+                _source_lines[filename] = f.readlines()
+        except (OSError, SyntaxError):
+            _source_lines[filename] = []
+    return _source_lines[filename]
+
+
+class SourceRef(object):
+    """函数源码的位置, 需要时才从缓存的源文件中按行截取"""
+    __slots__ = ('filename', 'lineno')
+
+    def __init__(self, filename, lineno):
+        self.filename = filename
+        self.lineno = lineno
+
+    @classmethod
+    def of(cls, func):
+        """函数的源码位置, 无法定位时返回None"""
+        code = getattr(inspect.unwrap(func), '__code__', None)
+        if code is None:
+            return None
+        return cls(code.co_filename, code.co_firstlineno)
+
+    def resolve(self) -> str:
+        key = (self.filename, self.lineno)
+        if key not in _source_cache:
+            lines = _read_source_lines(self.filename)[self.lineno - 1:]
+            try:
+                _source_cache[key] = ''.join(inspect.getblock(lines)) if lines else ''
+            except (IndentationError, SyntaxError, tokenize.TokenError):
+                _source_cache[key] = ''
+        return _source_cache[key]
@@ -37,5 +37,8 @@ setup(
     url='https://github.com/hanzhichao/htmlrunner',
     version='0.13',
     zip_safe=True,
-    install_requires=['jinja2', 'logz']
+    install_requires=['jinja2', 'logz'],
+    entry_points={
+        'console_scripts': ['htmlrunner=htmlrunner.cli:main'],
+    },
 )
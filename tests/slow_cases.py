@@ -0,0 +1,35 @@
+"""超时及异步执行测试使用的用例, 文件名不以test开头以免被直接收集"""
+import time
+import asyncio
+import unittest
+
+
+class SlowCase(unittest.TestCase):
+    def test_busy(self):
+        while True:
+            pass
+
+    def test_sleep(self):
+        time.sleep(30)
+
+    def test_fast(self):
+        pass
+
+
+class AsyncCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.loop = asyncio.get_running_loop()
+
+    async def test_a(self):
+        print('a')
+        await asyncio.sleep(0.3)
+
+    async def test_b(self):
+        await asyncio.sleep(0.3)
+        self.fail('b')
+
+    async def test_c(self):
+        await asyncio.sleep(0.3)
+
+    async def test_hang(self):
+        await asyncio.sleep(30)
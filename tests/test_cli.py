@@ -0,0 +1,77 @@
+import os
+import json
+import sys
+import subprocess
+
+from htmlrunner.cli import main
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = '''import unittest
+from htmlrunner.decorators import tag
+
+
+class TestCliCases(unittest.TestCase):
+    @tag(['smoke'])
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        """level:2"""
+        self.fail('fail')
+'''
+
+
+def test_collect_only_without_runner(tmp_path):
+    (tmp_path / 'test_cli_cases.py').write_text(CASES)
+    code = ('import sys; from htmlrunner.cli import main; main(["%s", "--collect-only", "--tags", "smoke"]); '
+            'print(any(name in sys.modules for name in ("jinja2", "logz", "htmlrunner.runner")))' % tmp_path)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=BASEDIR, universal_newlines=True)
+    assert '1.test_cli_cases.TestCliCases.test_a' in output
+    assert output.strip().endswith('False')  # 只收集用例时不导入runner及jinja2等
+
+
+def test_cli_run(tmp_path):
+    (tmp_path / 'test_cli_cases2.py').write_text(CASES)
+    args = [str(tmp_path), '-p', 'test_cli_cases2.py', '--output', str(tmp_path), '-o', 'report.html',
+            '--log-file', str(tmp_path / 'run.log'), '--export', str(tmp_path / 'result.xml'),
+            '--cache-file', str(tmp_path / 'index.json')]
+    assert main(args + ['--tags', 'smoke']) == 0
+    assert main(args) == 1
+    assert os.path.isfile(str(tmp_path / 'report.html'))
+    assert os.path.isfile(str(tmp_path / 'result.xml'))
+
+
+def test_cli_filtered_run_order(tmp_path):
+    (tmp_path / 'test_cli_order.py').write_text('''import unittest
+from htmlrunner.decorators import tag, order
+
+
+class TestA(unittest.TestCase):
+    @tag(['smoke'])
+    @order(2)
+    def test_a(self):
+        pass
+
+    @tag(['smoke'])
+    @order(1)
+    def test_b(self):
+        pass
+
+
+class TestB(unittest.TestCase):
+    @tag(['smoke'])
+    def test_c(self):
+        self.fail('fail')
+''')
+    event_log, last_run = str(tmp_path / 'events.jsonl'), str(tmp_path / 'last.jsonl')
+    args = [str(tmp_path), '-p', 'test_cli_order.py', '--output', str(tmp_path), '--log-file',
+            str(tmp_path / 'run.log'), '--tags', 'smoke']
+
+    def run_order(path, *extra):
+        main(args + ['--event-log', path] + list(extra))
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line)['name'] for line in f if '"test"' in line]
+
+    assert run_order(last_run) == ['test_b', 'test_a', 'test_c']  # 筛选后仍按order排列
+    assert run_order(event_log, '--last-run', last_run) == ['test_c', 'test_b', 'test_a']
@@ -1,7 +1,8 @@
 import unittest
 import sys
 sys.path.append('/Users/superhin/项目/htmlrunner')
-from htmlrunner.decorators import tag, level
+from htmlrunner.decorators import tag, level, order
+from htmlrunner.utils import get_case_meta
 
 
 
@@ -11,9 +12,67 @@ class TestA(unittest.TestCase):
     def test_a(self):
         pass
 
+class TestMeta(unittest.TestCase):
+    @tag(['smoke'])
+    @level(1)
+    @order(2)
+    def test_decorated(self):
+        """tag:api level:3"""
+
+    def test_doc(self):
+        """tag:api level:3 order:1"""
+
+
+def test_case_meta():
+    assert get_case_meta(TestMeta('test_decorated')) == (['api', 'smoke'], 1, 2)
+    assert get_case_meta(TestMeta('test_doc')) == (['api'], 3, 1)
+    assert get_case_meta(TestA('test_a')) == (['smoke', 'abc', 'api'], -1, 100)
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestA)
     print(suite)
     for case in suite:
         test_method = getattr(case, case._testMethodName)
         print(case, test_method.tags)
+
+
+def test_data_driven(tmp_path):
+    from htmlrunner.decorators import data, times, csv, datafile
+    from htmlrunner.runner import Runner
+    csv_file = tmp_path / 'users.csv'
+    csv_file.write_text('name,password\nadmin,"12\n34"\n\nguest,abc\n', encoding='utf-8')
+    jsonl_file = tmp_path / 'rows.jsonl'
+    jsonl_file.write_text('{"a": 1, "b": 2}\n[3, 4]\n', encoding='utf-8')
+    calls = []
+
+    class TestData(unittest.TestCase):
+        @tag(['smoke'])
+        @data(1, 'a b', [1, 2])
+        def test_data(self, value):
+            calls.append(value)
+
+        @times(2)
+        def test_times(self):
+            calls.append('times')
+
+        @level(1)
+        @csv(str(csv_file))
+        def test_csv(self, name, password):
+            calls.append((name, password))
+
+        @datafile(str(jsonl_file))
+        def test_jsonl(self, a, b):
+            calls.append(a + b)
+
+    names = unittest.defaultTestLoader.getTestCaseNames(TestData)
+    assert names == ['test_csv_1', 'test_csv_2', 'test_data_1_1', 'test_data_2_a_b', 'test_data_3',
+                     'test_jsonl_1', 'test_jsonl_2', 'test_times_1', 'test_times_2']
+    assert get_case_meta(TestData('test_data_2_a_b')).tags == ['smoke']
+    assert get_case_meta(TestData('test_csv_1')).level == 1
+
+    result = Runner().run(unittest.defaultTestLoader.loadTestsFromTestCase(TestData))
+    assert len(result.success) == 9
+    assert ('admin', '12\n34') in calls and ('guest', 'abc') in calls
+    assert calls.count(3) == 1 and calls.count(7) == 1 and calls.count('times') == 2
+    assert 'calls.append(value)' in result.result[TestData('test_data_3').id()].code
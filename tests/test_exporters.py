@@ -0,0 +1,67 @@
+import json
+import unittest
+from xml.etree import ElementTree
+
+from htmlrunner.runner import Runner
+from htmlrunner.exporters import read_binary
+
+
+def test_exporters(tmp_path):
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            print('hello <world>\x01')
+
+        def test_fail(self):
+            self.fail('fail & stop')
+
+        @unittest.skip('skip')
+        def test_skip(self):
+            pass
+
+    xml_file, jsonl_file, binary_file = (str(tmp_path / name) for name in ('r.xml', 'r.jsonl', 'r.htrb'))
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestA)
+    result = Runner(threads=2, exporters=[xml_file, jsonl_file, binary_file]).run(suite)
+
+    testsuite = ElementTree.parse(xml_file).getroot().find('testsuite')
+    assert (testsuite.get('tests'), testsuite.get('failures'), testsuite.get('skipped')) == \
+           ('0000000003', '0000000001', '0000000001')
+    cases = {case.get('name'): case for case in testsuite.iter('testcase')}
+    assert cases['test_fail'].find('failure').get('message').endswith('fail & stop')
+    assert cases['test_pass'].find('system-out').text.strip() == 'hello <world>'
+
+    with open(jsonl_file, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    assert [event['event'] for event in events] == ['start', 'test', 'test', 'test', 'end']
+
+    items = {item['name']: item for item in read_binary(binary_file)}
+    assert {name: item['status'] for name, item in items.items()} == \
+           {name: item.status for name, item in ((item.name, item) for item in result.result.values())}
+    assert items['test_pass']['test_class'] == 'tests.test_exporters.TestA'
+    assert items['test_skip']['duration'] is not None
+
+
+def test_exporters_with_reruns(tmp_path):
+    runs = []
+
+    class TestB(unittest.TestCase):
+        def test_flaky(self):
+            runs.append(1)
+            self.assertGreater(len(runs), 1)
+
+        def test_fail(self):
+            self.fail('always')
+
+    xml_file, binary_file = str(tmp_path / 'r.xml'), str(tmp_path / 'r.htrb')
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestB)
+    Runner(reruns=1, threads=2, exporters=[xml_file, binary_file]).run(suite)
+
+    testsuite = ElementTree.parse(xml_file).getroot().find('testsuite')
+    assert (testsuite.get('tests'), testsuite.get('failures')) == ('0000000002', '0000000001')
+    cases = {case.get('name'): case for case in testsuite.iter('testcase')}
+    assert len(cases) == 2
+    assert cases['test_flaky'].find('failure') is None
+    assert len(cases['test_flaky'].findall('flakyFailure')) == 1
+    assert cases['test_fail'].find('failure') is not None
+    assert len(cases['test_fail'].findall('rerunFailure')) == 1
+    assert sorted((item['name'], item['status']) for item in read_binary(binary_file)) == \
+           [('test_fail', 'FAIL'), ('test_flaky', 'PASS')]
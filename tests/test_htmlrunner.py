@@ -1,8 +1,10 @@
 import os
 import sys
+import time
 sys.path.append('/Users/apple/Documents/Projects/Self/PyPi/htmlrunner')
 import unittest
 from htmlrunner import Runner,  HTMLRunner
+from htmlrunner.runner import get_environment, LiveReport
 from htmlrunner.loader import group_test_by_class, flatten_suite
 from htmlrunner.result import Result
 
@@ -39,11 +41,12 @@ def test_run_suite():
     runner.run_suite(suite, result)
     print(result)
 
-def test_run_suite_in_thread_poll():
+def test_run_suite_in_thread_pool():
     suite = unittest.defaultTestLoader.discover(testpath)
-    result = unittest.result.TestResult()
-    runner.run_suite_in_thread_poll(suite, result)
-    print(result)
+    result = Result()
+    Runner(threads=3).run_suite_in_thread_pool(suite, result)
+    assert result.testsRun == suite.countTestCases()
+    assert result.totol == suite.countTestCases()
 
 def test_group_suites_by_class():
     suite = unittest.defaultTestLoader.discover(testpath)
@@ -106,6 +109,186 @@ def test_with_images():
                title="测试报告",
                description="测试报告描述", tester='Hzc', threads=1, timeout=1).run(suite)
 
+def test_run_with_workers():
+    serial_result = Runner().run(unittest.defaultTestLoader.discover(testpath))
+    suite = unittest.defaultTestLoader.discover(testpath)
+    result = Runner(workers=2).run(suite)
+    assert sorted(result.result) == sorted(serial_result.result)
+    assert result.testsRun == serial_result.testsRun
+    assert len(result.failures) == len(serial_result.failures)
+    assert [item['sn'] for item in result.result.values()] == list(range(1, result.totol + 1))
+
+def test_run_with_watchdog_timeout():
+    from tests.slow_cases import SlowCase
+    suite = unittest.TestSuite([SlowCase('test_busy'), SlowCase('test_fast')])
+    result = Runner(timeout=0.5).run(suite)
+    assert result.result['tests.slow_cases.SlowCase.test_busy']['status'] == 'TIMEOUT'
+    assert result.result['tests.slow_cases.SlowCase.test_fast']['status'] == 'PASS'
+    assert len(result.timeouts) == 1
+
+
+
+def test_watchdog_warns_blocked_test(monkeypatch):
+    from htmlrunner import runner as runner_module
+    warnings = []
+    monkeypatch.setattr(runner_module, 'WATCHDOG_GRACE', 0.2)
+    monkeypatch.setattr(runner_module.log, 'warning', lambda msg, *args: warnings.append(msg))
+
+    class TestBlocked(unittest.TestCase):
+        def test_blocked(self):
+            time.sleep(1)  # 阻塞在C代码中, 调用返回后才能中断
+
+    result = Runner(timeout=0.2).run(unittest.TestSuite([TestBlocked('test_blocked')]))
+    assert result.timeouts and len(warnings) == 1 and 'isolate=True' in warnings[0]
+
+def test_run_async_tests_on_shared_loop():
+    from tests.slow_cases import AsyncCase
+    tests = [AsyncCase('test_a'), AsyncCase('test_b'), AsyncCase('test_c')]
+    start = time.monotonic()
+    result = Runner(async_workers=3, ensure_sequence=False).run(unittest.TestSuite(tests))
+    assert time.monotonic() - start < 0.8  # 3个用例并发执行
+    assert [result.result[test.id()]['status'] for test in tests] == ['PASS', 'FAIL', 'PASS']
+    assert result.result[tests[0].id()]['output'] == 'a\n'
+    assert len({test.loop for test in tests}) == 1
+
+    tests = [AsyncCase('test_a'), AsyncCase('test_c'), AsyncCase('test_hang')]
+    start = time.monotonic()
+    result = Runner(async_workers=3, timeout=1).run(unittest.TestSuite(tests))
+    assert time.monotonic() - start >= 1.6  # 同一测试类的用例按顺序执行
+    assert result.result[tests[2].id()]['status'] == 'TIMEOUT'
+
+
+def test_run_with_reruns():
+    from htmlrunner.decorators import rerun
+    calls = []
+
+    class TestA(unittest.TestCase):
+        def test_flaky(self):
+            calls.append('flaky')
+            self.assertGreater(calls.count('flaky'), 2)
+
+        @rerun(1)
+        def test_fail(self):
+            calls.append('fail')
+            self.fail('always')
+
+        def test_pass(self):
+            calls.append('pass')
+
+    tests = [TestA('test_flaky'), TestA('test_fail'), TestA('test_pass')]
+    result = Runner(reruns=3).run(unittest.TestSuite(tests))
+    assert calls.count('flaky') == 3 and calls.count('fail') == 2 and calls.count('pass') == 1
+    flaky, fail = result.result[tests[0].id()], result.result[tests[1].id()]
+    assert flaky.status == 'PASS' and [a['status'] for a in flaky.attempts] == ['FAIL', 'FAIL']
+    assert fail.status == 'FAIL' and len(fail.attempts) == 1
+    assert (flaky.sn, fail.sn) == (1, 2)
+    assert result.testsRun == 3 and len(result.failures) == 1 and len(result.success) == 2
+    assert (result.rerun_num, result.flaky_num) == (3, 1)
+
+
+def test_rerun_with_class_fixtures():
+    calls = []
+
+    def make_case(name, flaky):
+        class TestCase(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                calls.append('setUpClass %s' % name)
+                cls.res = 'open'
+
+            @classmethod
+            def tearDownClass(cls):
+                calls.append('tearDownClass %s' % name)
+                cls.res = 'closed'
+
+            def test_a(self):
+                calls.append('test %s %s' % (name, self.res))
+                if flaky:
+                    self.assertGreater(calls.count('test %s open' % name), 1)
+        TestCase.__qualname__ = TestCase.__name__ = 'Test%s' % name
+        return TestCase
+
+    for names in ('AB', 'BA'):  # 重跑的用例分别在第一个和最后一个测试类中
+        calls.clear()
+        cases = {name: make_case(name, name == 'A') for name in names}
+        suite = unittest.TestSuite([cases[name]('test_a') for name in names])
+        result = Runner(reruns=1).run(suite)
+        assert len(result.success) == 2
+        assert calls.count('setUpClass A') == calls.count('tearDownClass A') == 2
+        assert calls.count('setUpClass B') == calls.count('tearDownClass B') == 1
+        assert calls[-3:] == ['setUpClass A', 'test A open', 'tearDownClass A']
+
+def test_run_isolated_with_timeout():
+    from tests.slow_cases import SlowCase
+    suite = unittest.TestSuite([SlowCase('test_sleep'), SlowCase('test_fast')])
+    result = Runner(timeout=1, isolate=True, workers=2).run(suite)
+    assert result.result['tests.slow_cases.SlowCase.test_sleep']['status'] == 'TIMEOUT'
+    assert result.result['tests.slow_cases.SlowCase.test_fast']['status'] == 'PASS'
+    assert result.testsRun == 2
+
+def test_generate_report_with_template_dirs(tmp_path):
+    (tmp_path / 'mine.html').write_text('{{ title }} {{ total }}')
+    runner = HTMLRunner(output=str(tmp_path / 'reports'), title='T',
+                        template='mine', template_dirs=[str(tmp_path)])
+    runner.run(unittest.TestSuite())
+    assert runner.report_file == str(tmp_path / 'reports' / 'report.html')
+    with open(runner.report_file) as f:
+        assert f.read() == 'T 0'
+    assert get_environment([str(tmp_path)]) is get_environment([str(tmp_path)])
+
+def test_generate_lazy_report(tmp_path):
+    suite = unittest.defaultTestLoader.discover(testpath)
+    runner = HTMLRunner(output=str(tmp_path), lazy=True)
+    runner.run(suite)
+    data_files = sorted(os.listdir(runner.data_dir))
+    assert len(data_files) == 3
+    with open(os.path.join(runner.data_dir, data_files[0]), encoding='utf-8') as f:
+        assert f.read().startswith('htmlrunnerLoad("%s", [{' % data_files[0][6:-3])
+    with open(runner.report_file, encoding='utf-8') as f:
+        content = f.read()
+    assert 'report_data/%s' % data_files[0] in content
+    assert 'traceback' not in content.lower()  # 用例详情不写入报告页面
+
+
+def test_event_log_and_rebuild_report(tmp_path):
+    event_log = str(tmp_path / 'events.jsonl')
+    suite = unittest.defaultTestLoader.discover(testpath)
+    runner = HTMLRunner(output=str(tmp_path), event_log=event_log, refresh_interval=0.2)
+    result = runner.run(suite)
+    rebuilt = Result.from_event_log(event_log)
+    assert sorted(rebuilt.result) == sorted(result.result)
+    assert (rebuilt.testsRun, len(rebuilt.success), len(rebuilt.failures), len(rebuilt.errors)) == \
+           (result.testsRun, len(result.success), len(result.failures), len(result.errors))
+    assert rebuilt.start_at == result.start_at
+
+    with open(event_log, encoding='utf-8') as f:  # 模拟运行中断: 只保留前5个用例
+        lines = f.readlines()[:6]
+    with open(event_log, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    runner.generate_report_from_log(event_log)
+    with open(runner.report_file, encoding='utf-8') as f:
+        assert '总数: 5 ' in f.read()
+
+
+
+def test_live_report_uses_data_files(tmp_path):
+    event_log = str(tmp_path / 'events.jsonl')
+    suite = unittest.defaultTestLoader.discover(testpath)
+    Runner(event_log=event_log).run(suite)
+
+    runner = HTMLRunner(output=str(tmp_path), event_log=event_log)  # 非分页模板
+    live_report = LiveReport(runner, event_log, 1)
+    live_report.refresh()  # 运行中刷新只写入变化的测试类的数据文件
+    assert len(os.listdir(runner.data_dir)) == 3
+    with open(runner.report_file, encoding='utf-8') as f:
+        content = f.read()
+    assert 'report_data/' in content and 'traceback' not in content.lower()
+
+    runner._live_report = live_report
+    runner._generate_final_report(live_report.result)
+    assert not os.path.exists(runner.data_dir)
+    with open(runner.report_file, encoding='utf-8') as f:
+        assert 'report_data/' not in f.read()
 
 if __name__ == "__main__":
     test_with_images()
\ No newline at end of file
@@ -0,0 +1,41 @@
+import base64
+import os
+import unittest
+
+from htmlrunner.images import ImageWriter
+from htmlrunner.runner import Runner
+
+
+def test_image_writer(tmp_path):
+    image_file = tmp_path / 'a.jpeg'
+    image_file.write_bytes(b'jpeg data')
+    writer = ImageWriter(str(tmp_path / 'report'))
+    images = writer.save([('bin', b'png data'),
+                          ('base64', base64.b64encode(b'png data').decode()),
+                          str(image_file),
+                          ('file', str(tmp_path / 'missing.png'))])
+    writer.close()
+    assert len(images) == 3
+    assert images[0] == images[1]  # 相同内容只保存一份
+    assert images[2].endswith('.jpeg')
+    assert sorted(os.listdir(tmp_path / 'report' / 'images')) == sorted(os.path.basename(path) for path in images[1:])
+    assert (tmp_path / 'report' / images[0]).read_bytes() == b'png data'
+
+
+def test_reused_image_path(tmp_path):
+    image_file = tmp_path / 'screenshot.png'
+
+    class TestA(unittest.TestCase):
+        def test_a(self):
+            image_file.write_bytes(b'first')
+            self.images = [str(image_file)]
+
+        def test_b(self):
+            image_file.write_bytes(b'second')  # 同一路径被后续用例覆盖
+            self.images = [str(image_file)]
+
+    output = str(tmp_path / 'report')
+    result = Runner(output=output).run(unittest.TestSuite([TestA('test_a'), TestA('test_b')]))
+    images = [result.result[TestA(name).id()].images[0] for name in ('test_a', 'test_b')]
+    assert images[0] != images[1]
+    assert [(tmp_path / 'report' / path).read_bytes() for path in images] == [b'first', b'second']
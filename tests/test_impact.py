@@ -0,0 +1,37 @@
+from htmlrunner.impact import CoverageMap
+from htmlrunner.loader import Loader
+from htmlrunner.runner import Runner
+
+
+def test_coverage_map_and_select(tmp_path):
+    (tmp_path / 'calc_impact.py').write_text('''def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+''')
+    (tmp_path / 'test_calc_impact.py').write_text('''import unittest
+import calc_impact
+
+
+class TestCalc(unittest.TestCase):
+    def test_add(self):
+        self.assertEqual(calc_impact.add(1, 2), 3)
+
+    def test_sub(self):
+        self.assertEqual(calc_impact.sub(2, 1), 1)
+''')
+    for workers in (None, 2):  # 子进程中的覆盖记录随结果返回
+        path = str(tmp_path / ('coverage_%s.json' % workers))
+        loader = Loader(str(tmp_path))
+        Runner(workers=workers, coverage_map=CoverageMap(path, root=str(tmp_path))).run(loader.suite)
+
+        coverage_map = CoverageMap(path, root=str(tmp_path))
+        assert coverage_map.tests['test_calc_impact.TestCalc.test_add']['calc_impact.py'] == [1, 2]
+        test_ids = loader.test_ids + ['test_calc_impact.TestCalc.test_new']
+        assert coverage_map.select([str(tmp_path / 'calc_impact.py')], test_ids) == test_ids
+        assert coverage_map.select({str(tmp_path / 'calc_impact.py'): [5]}, test_ids) == \
+               ['test_calc_impact.TestCalc.test_sub', 'test_calc_impact.TestCalc.test_new']  # 新用例总是执行
+        assert loader.select_by_changes([str(tmp_path / 'other.py')], path) == []
+        assert loader.select_by_changes([str(tmp_path / 'data.csv')], path) == loader.test_ids
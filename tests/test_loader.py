@@ -1,6 +1,11 @@
+import os
+import sys
 import unittest
+from datetime import datetime
 from htmlrunner.loader import Loader, group_test_by_class
+from htmlrunner.index import parse_test_file
 from htmlrunner.runner import Runner, HTMLRunner
+from htmlrunner.result import EventLog
 
 # suite = unittest.defaultTestLoader.discover('tests')
 # for test in suite:
@@ -27,4 +32,208 @@ class TestA(unittest.TestCase):
 
 loader = Loader(suite=unittest.defaultTestLoader.loadTestsFromTestCase(TestA))
 runner = Runner()
-runner.run(loader.suite)
\ No newline at end of file
+runner.run(loader.suite)
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+testpath = os.path.join(basedir, 'tests', 'data')
+
+
+def test_suite_discovered_once():
+    loader = Loader(testpath)
+    runner.run(loader.suite)
+    assert loader.suite.countTestCases() == 16
+    assert len(loader.fsuite._tests) == 16
+
+
+class CountingLoader(unittest.TestLoader):
+    def __init__(self):
+        super().__init__()
+        self.names = []
+
+    def loadTestsFromName(self, name, module=None):
+        self.names.append(name)
+        return super().loadTestsFromName(name, module)
+
+
+def test_index_cache_file(tmp_path):
+    cache_file = str(tmp_path / 'index.json')
+    test_ids = Loader(testpath, cache_file=cache_file).test_ids
+    assert len(test_ids) == 16
+    assert os.path.isfile(cache_file)
+
+    loader = Loader(testpath, cache_file=cache_file)
+    loader._loader = CountingLoader()
+    assert loader.test_ids == test_ids
+    assert loader._loader.names == []  # 测试文件未修改, 不重新导入
+    suite = loader.load(test_ids[:2])
+    assert [test.id() for test in suite] == test_ids[:2]
+
+
+def test_static_collect_fallback(tmp_path):
+    (tmp_path / 'helpers_static.py').write_text('''import unittest
+
+
+class TestHelper(unittest.TestCase):
+    def test_helper(self):
+        pass
+
+
+def make_case():
+    class Generated(unittest.TestCase):
+        def test_generated(self):
+            pass
+    return Generated
+''')
+    (tmp_path / 'test_static_c.py').write_text('''import unittest
+from helpers_static import *
+
+BASE_URL = 'http://localhost'
+TestGenerated = make_case()
+
+
+class TestZ(unittest.TestCase):
+    def test_z(self):
+        pass
+''')
+    (tmp_path / 'test_static_d.py').write_text('''import unittest
+
+
+class TestZ(unittest.TestCase):
+    def test_z(self):
+        pass
+
+
+class TestA(unittest.TestCase):
+    def test_a(self):
+        pass
+''')
+    assert parse_test_file(str(tmp_path / 'test_static_c.py'), 'test_static_c') is None  # 需要导入
+    test_ids = Loader(str(tmp_path), static=True).test_ids
+    assert test_ids == Loader(str(tmp_path)).test_ids
+    assert len(test_ids) == 5 and test_ids[-2:] == ['test_static_d.TestA.test_a', 'test_static_d.TestZ.test_z']
+
+def test_index_data_files(tmp_path):
+    (tmp_path / 'rows.csv').write_text('a\n1\n', encoding='utf-8')
+    (tmp_path / 'test_index_data.py').write_text('''import unittest
+from htmlrunner.decorators import csv
+
+
+class TestRows(unittest.TestCase):
+    @csv('rows.csv')
+    def test_row(self, a):
+        pass
+''')
+    cache_file = str(tmp_path / 'index.json')
+    assert Loader(str(tmp_path), cache_file=cache_file).test_ids == ['test_index_data.TestRows.test_row_1']
+
+    with open(str(tmp_path / 'rows.csv'), 'a', encoding='utf-8') as f:
+        f.write('2\n')
+    sys.modules.pop('test_index_data')  # 模拟新的进程
+    loader = Loader(str(tmp_path), cache_file=cache_file)
+    loader._loader = CountingLoader()
+    assert loader.test_ids == ['test_index_data.TestRows.test_row_1', 'test_index_data.TestRows.test_row_2']
+    assert loader._loader.names == ['test_index_data']  # 数据文件修改后重新导入
+
+
+def test_collect_by_tags_and_level(tmp_path):
+    (tmp_path / 'test_meta_cases.py').write_text('''import unittest
+from htmlrunner.decorators import tag
+
+
+class TestMetaCases(unittest.TestCase):
+    def test_a(self):
+        """tag:api level:1"""
+
+    @tag(['smoke'])
+    def test_b(self):
+        """level:2"""
+
+    def test_c(self):
+        """tag:web"""
+''')
+    loader = Loader(str(tmp_path), cache_file=str(tmp_path / 'index.json'))
+    ids = lambda suite: [test._testMethodName for test in suite]
+    assert ids(loader.collect_by_tags(['smoke', 'api'])) == ['test_a', 'test_b']
+    assert ids(loader.collect_by_level(1)) == ['test_a']
+    assert loader.index.by_tag['web'] == ['test_meta_cases.TestMetaCases.test_c']
+
+
+def test_psuite_failed_first(tmp_path):
+    event_log = str(tmp_path / 'last_run.jsonl')
+    classes = list(Loader(testpath).osuite)
+    failed_test = list(classes[-1])[0]
+    log = EventLog(event_log)
+    log.write('start', start_at=datetime.now().isoformat())
+    for suite in classes:
+        for test in suite:
+            log.write('test', full_path=test.id(), status='FAIL' if test is failed_test else 'PASS')
+    log.close()
+
+    classes = list(Loader(testpath).psuite(event_log))
+    assert list(classes[0])[0].id() == failed_test.id()  # 上次失败的测试类最先执行
+    assert sum(suite.countTestCases() for suite in classes) == 16
+
+    changed_test = list(classes[-1])[0]
+    module_file = sys.modules[changed_test.__class__.__module__].__file__
+    stat = os.stat(module_file)
+    os.utime(module_file, (stat.st_atime, datetime.now().timestamp() + 60))
+    try:
+        classes = list(Loader(testpath).psuite(event_log))
+    finally:
+        os.utime(module_file, (stat.st_atime, stat.st_mtime))
+    assert list(classes[1])[0].id() == changed_test.id()  # 其次是修改过模块的测试类
+
+
+def test_static_collect(tmp_path):
+    (tmp_path / 'test_static_a.py').write_text('''import unittest
+from unittest import TestCase
+from htmlrunner.decorators import tag, level
+
+
+class Mixin(object):
+    def test_mixin(self):
+        """tag:api order:1"""
+
+
+class TestBase(TestCase):
+    @tag('smoke')
+    @level(2)
+    def test_base(self):
+        pass
+
+
+class TestStatic(Mixin, TestBase):
+    @unittest.skip('skip')
+    async def test_b(self):
+        """level:1"""
+
+    def helper(self):
+        pass
+''')
+    (tmp_path / 'test_static_b.py').write_text('''import unittest
+from htmlrunner.decorators import data
+
+
+class TestDynamic(unittest.TestCase):
+    @data(1, 2)
+    def test_a(self, value):
+        pass
+''')
+    static_loader = Loader(str(tmp_path), static=True)
+    entries = static_loader.index.files
+    assert 'test_static_a' not in sys.modules  # 静态解析, 未导入
+    assert 'test_static_b' in sys.modules  # 无法静态确定, 导入
+    assert entries == Loader(str(tmp_path), cache_file=str(tmp_path / 'index.json')).index.files
+
+    (tmp_path / 'testlist.txt').write_text('test_static_a.TestStatic.test_b\ntest_a_2_2\n')
+    loader = Loader(str(tmp_path), static=True)
+    assert loader.select_by_list(str(tmp_path / 'testlist.txt')) == \
+           ['test_static_a.TestStatic.test_b', 'test_static_b.TestDynamic.test_a_2_2']
+    assert [test.id() for test in loader.collect_by_list(str(tmp_path / 'testlist.txt'))] == \
+           ['test_static_a.TestStatic.test_b', 'test_static_b.TestDynamic.test_a_2_2']
+
+    (tmp_path / 'testlist.txt').write_text('test_static_a.TestStatic.test_mixin\n')
+    loader = Loader(str(tmp_path))
+    suite = loader.collect_by_list(str(tmp_path / 'testlist.txt'))
+    assert [test.id() for test in suite] == ['test_static_a.TestStatic.test_mixin']
+    assert loader._index is None and loader._discovered is None  # 完整id直接加载, 无需discover
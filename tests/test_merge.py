@@ -0,0 +1,34 @@
+import os
+import unittest
+
+from htmlrunner.runner import Runner
+from htmlrunner.merge import merge
+
+
+def test_merge_shards(tmp_path):
+    class TestA(unittest.TestCase):
+        def test_a(self):
+            pass
+
+        def test_b(self):
+            self.fail('fail')
+
+    class TestB(unittest.TestCase):
+        def test_a(self):
+            self.images = [('bin', b'image')]
+
+    paths = []
+    for index, case in enumerate((TestA, TestB)):
+        shard_dir = tmp_path / ('shard%s' % index)
+        paths.append(str(shard_dir / 'events.jsonl'))
+        Runner(event_log=paths[-1], output=str(shard_dir)).run(
+            unittest.defaultTestLoader.loadTestsFromTestCase(case))
+
+    output = str(tmp_path / 'merged')
+    result = merge(paths, report_file='report.html', output=output, log_file=str(tmp_path / 'run.log'))
+    assert [item.sn for item in result.result.values()] == [1, 2, 3]
+    assert result.testsRun == 3 and len(result.failures) == 1
+    assert sorted(item['name'] for item in result.sortByClass()) == sorted(result.test_class)
+    assert result.start_at <= result.end_at
+    assert os.path.isfile(os.path.join(output, 'report.html'))
+    assert os.listdir(os.path.join(output, 'images'))
@@ -0,0 +1,207 @@
+import gc
+import time
+import weakref
+import threading
+import unittest
+from datetime import timedelta
+
+from htmlrunner.result import Result, TestClasses, TestRecord, restore_output
+from htmlrunner.runner import Runner
+from htmlrunner.utils import SourceRef
+
+
+def test_capture_output_per_thread():
+    result = Result()
+    outputs = {}
+
+    def run(name):
+        result.capture_output()
+        for i in range(200):
+            print(name)
+        outputs[name] = result.complete_output()
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in 'abcd']
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    restore_output()
+    for name, output in outputs.items():
+        assert output == '%s\n' % name * 200
+
+
+def test_capture_helper_thread_output():
+    class TestA(unittest.TestCase):
+        def test_a(self):
+            thread = threading.Thread(target=print, args=('from helper',))
+            thread.start()
+            thread.join()
+
+        def test_b(self):
+            print('from test_b')
+
+    result = Runner().run(unittest.TestSuite([TestA('test_a'), TestA('test_b')]))
+    restore_output()
+    assert result.result[TestA('test_a').id()].output == 'from helper\n'  # 串行执行时用例中新建线程的输出
+    assert result.result[TestA('test_b').id()].output == 'from test_b\n'
+
+
+def test_complete_output_without_capture():
+    result = Result()
+    assert result.complete_output() == ''
+
+
+def test_test_classes_reiterable():
+    class TestB(unittest.TestCase):
+        def test_pass(self):
+            pass
+
+        def test_fail(self):
+            self.fail()
+
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            pass
+
+    suite = unittest.TestSuite([TestB('test_pass'), TestB('test_fail'), TestA('test_pass')])
+    result = Runner().run(suite)
+    test_classes = TestClasses(result)
+    assert len(test_classes) == 2
+    assert [c['name'].rsplit('.', 1)[-1] for c in test_classes] == ['TestA', 'TestB']
+    assert [(c['total'], c['pass_num'], c['fail_num']) for c in test_classes] == [(1, 1, 0), (2, 1, 1)]
+
+
+def test_test_record():
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            print('hello')
+
+    test = TestA('test_pass')
+    result = Runner(release_tests=True).run(unittest.TestSuite([test]))
+    record = result.result[test.id()]
+    assert isinstance(record, TestRecord)
+    assert record['status'] == record.status == 'PASS'
+    assert record.get('output') == 'hello\n'
+    assert record.obj is None
+    assert result.success == [test.id()]
+    assert not hasattr(test, 'output')
+    assert 'obj' not in result.to_dict()['result'][0]
+
+
+def test_release_tests():
+    class TestA(unittest.TestCase):
+        def test_fail(self):
+            self.fail('fail')
+
+        def test_error(self):
+            raise RuntimeError('error')
+
+        @unittest.skip('skip')
+        def test_skip(self):
+            pass
+
+        @unittest.expectedFailure
+        def test_xfail(self):
+            self.fail('xfail')
+
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestA)
+    refs = [weakref.ref(test) for test in suite]
+    result = Runner(release_tests=True).run(suite)
+    del suite
+    gc.collect()
+    assert all(ref() is None for ref in refs)  # 结果中不再引用用例对象
+    assert [len(tests) for tests in (result.failures, result.errors, result.skipped, result.expectedFailures)] \
+           == [1, 1, 1, 1]
+    assert all(isinstance(test, str) for tests in (result.failures, result.errors, result.skipped,
+                                                   result.expectedFailures) for test, _ in tests)
+
+
+def test_class_stats():
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            time.sleep(0.01)
+
+        def test_fail(self):
+            self.fail()
+
+        def test_timeout(self):
+            time.sleep(0.2)
+
+    suite = unittest.TestSuite([TestA('test_pass'), TestA('test_fail'), TestA('test_timeout')])
+    result = Runner(timeout=0.05).run(suite)
+    test_class = result.sortByClass()[0]
+    assert (test_class['total'], test_class['pass_num'], test_class['fail_num'], test_class['timeout_num']) == (3, 1, 1, 1)
+    assert test_class['duration'] >= 0.05
+    assert test_class['slowest'][0].name == 'test_timeout'
+    assert test_class['max_duration'] == round(test_class['slowest'][0].duration.total_seconds(), 3)
+    module = list(result.iter_modules())[0]
+    assert module['total'] == 3
+
+
+def test_slowest_backfill():
+    result = Result()
+
+    def add(name, seconds):
+        result.add_item(dict(full_path='m.A.%s' % name, name=name, test_class='m.A', test_module='m',
+                             status='PASS', duration=timedelta(seconds=seconds)))
+
+    for i, seconds in enumerate((4, 3, 2, 1)):
+        add('test_%s' % i, seconds)
+    add('test_0', 0.5)  # 重跑后替换了最慢的用例
+    stats = result.test_class['m.A']
+    assert [item.name for item in stats.slowest] == ['test_1', 'test_2', 'test_3']
+    assert stats.max_duration == timedelta(seconds=3)
+
+
+def test_capture_code():
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            pass
+
+        def test_fail(self):
+            self.fail()
+
+    suite = unittest.TestSuite([TestA('test_pass'), TestA('test_fail')])
+    result = Runner().run(suite)
+    record = result.result[TestA('test_fail').id()]
+    assert isinstance(record._code, SourceRef)
+    assert record.code.startswith('        def test_fail(self):')
+    assert record.code.endswith('self.fail()\n')
+
+    suite = unittest.TestSuite([TestA('test_pass'), TestA('test_fail')])
+    result = Runner(capture_code='failed').run(suite)
+    assert result.result[TestA('test_pass').id()].code is None
+    assert 'self.fail()' in result.result[TestA('test_fail').id()].code
+
+
+def test_code_lazy_across_merge(tmp_path):
+    class TestA(unittest.TestCase):
+        def test_a(self):
+            pass
+
+        def test_b(self):
+            pass
+
+    path = str(tmp_path / 'events.jsonl')
+    suite = unittest.TestSuite([TestA('test_a'), TestA('test_b')])
+    result = Runner(threads=2, event_log=path).run(suite)  # 线程结果合并及写入事件日志时不截取源码
+    assert all(isinstance(item._code, SourceRef) for item in result.result.values())
+    with open(path, encoding='utf-8') as f:
+        assert '"code_ref"' in f.read()
+
+    record = Result.from_event_log(path).result[TestA('test_b').id()]
+    assert isinstance(record._code, SourceRef)
+    assert record.code.strip().startswith('def test_b(self):')
+
+
+def test_thread_pool_keeps_test_objects():
+    class TestA(unittest.TestCase):
+        def test_pass(self):
+            pass
+
+        def test_fail(self):
+            self.fail()
+
+    tests = [TestA('test_pass'), TestA('test_fail')]
+    result = Runner(threads=2).run(unittest.TestSuite(tests))
+    assert result.failures[0][0] is tests[1] and result.success == [tests[0]]  # 与串行执行一致
+    assert result.result[tests[1].id()].obj is tests[1]
+    assert sorted(item.sn for item in result.result.values()) == [1, 2]
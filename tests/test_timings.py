@@ -0,0 +1,42 @@
+import unittest
+from datetime import timedelta
+
+from htmlrunner import result as result_module
+from htmlrunner.runner import Runner
+from htmlrunner.timings import TimingDB
+
+
+class Case(object):
+    def __init__(self, test_id):
+        self._id = test_id
+
+    def id(self):
+        return self._id
+
+
+def test_timing_db(tmp_path):
+    path = str(tmp_path / 'timings.json')
+    result = result_module.Result()
+    for test_id, seconds in (('m.A.test_a', 1), ('m.A.test_b', 3), ('m.B.test_a', 10)):
+        result.result[test_id] = result_module.TestRecord(full_path=test_id, duration=timedelta(seconds=seconds))
+    db = TimingDB(path)
+    db.update(result)
+    db.save()
+
+    db = TimingDB(path)
+    assert db.estimate('m.A.test_b') == 3
+    assert db.estimate('m.A.test_new') == 2  # 同一测试类的平均耗时
+    assert db.estimate('m.C.test_new') == 14 / 3  # 所有用例的平均耗时
+    shards = [[Case('m.A.test_a'), Case('m.A.test_b')], [Case('m.C.test_a')], [Case('m.B.test_a')]]
+    assert db.schedule(shards) == [shards[2], shards[1], shards[0]]
+
+
+def test_run_with_timing_db(tmp_path):
+    path = str(tmp_path / 'timings.json')
+
+    class TestA(unittest.TestCase):
+        def test_a(self):
+            pass
+
+    Runner(threads=2, timing_db=path).run(unittest.TestSuite([TestA('test_a')]))
+    assert list(TimingDB(path).tests) == [TestA('test_a').id()]